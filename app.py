@@ -1,177 +1,1082 @@
 # app.py - ClickUp Construction Assistant with Fixed MMS/Photo Support and Simple Voice
 # Complete version with working photo attachments and basic voice transcription
 
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import os
 import re
 import json
+import hmac
+import bisect
+import hashlib
+import sqlite3
 import base64
 import tempfile
+import uuid
+import threading
+import multiprocessing
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes - no cross-worker leader election
+    fcntl = None
 from io import BytesIO
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlencode
 from datetime import datetime, timedelta
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from flask import Flask, request, jsonify, render_template_string
 from flask_cors import CORS
-from twilio.twiml.messaging_response import MessagingResponse
-import openai
 
 app = Flask(__name__)
 CORS(app)
 app.secret_key = os.getenv('SECRET_KEY', 'your-secret-key-here')
 
-# File-based storage for settings (persists across restarts)
+# Settings storage (persists across restarts, shared by every worker)
 SETTINGS_FILE = 'settings.json'
+SETTINGS_BACKEND = os.getenv('SETTINGS_BACKEND', 'sqlite')
+SETTINGS_DB = os.getenv('SETTINGS_DB', 'settings.db')
 
-def load_settings():
-    """Load settings from file or create defaults"""
+# Top-level sections stored one row per entry
+SETTINGS_SECTIONS = ('team_members', 'job_types', 'projects')
+
+def default_settings():
+    """Default settings if nothing has been saved yet"""
+    return {
+        'team_members': {
+            'mike': {'name': 'Mike', 'role': 'Plumbing'},
+            'tom': {'name': 'Tom', 'role': 'Grading'},
+            'sarah': {'name': 'Sarah', 'role': 'Electrical'},
+            'john': {'name': 'John', 'role': 'General'}
+        },
+        'job_types': {
+            'plumbing': {'name': 'Plumbing', 'keywords': ['plumb', 'pipe', 'water', 'leak', 'faucet', 'valve']},
+            'electrical': {'name': 'Electrical', 'keywords': ['electric', 'wire', 'power', 'outlet', 'breaker', 'panel']},
+            'grading': {'name': 'Grading', 'keywords': ['grade', 'level', 'excavat', 'dirt', 'soil', 'slope']},
+            'concrete': {'name': 'Concrete', 'keywords': ['concrete', 'pour', 'slab', 'foundation', 'cement']},
+            'framing': {'name': 'Framing', 'keywords': ['frame', 'wall', 'roof', 'truss', 'stud']},
+            'safety': {'name': 'Safety', 'keywords': ['safety', 'danger', 'hazard', 'violation', 'osha']},
+            'inspection': {'name': 'Inspection', 'keywords': ['inspect', 'review', 'check', 'permit']}
+        },
+        'projects': {}  # Will store created projects
+    }
+
+def read_settings_file():
+    """Load settings.json, or the defaults if it doesn't exist"""
     try:
         with open(SETTINGS_FILE, 'r') as f:
             return json.load(f)
     except:
-        # Default settings if file doesn't exist
-        return {
-            'team_members': {
-                'mike': {'name': 'Mike', 'role': 'Plumbing'},
-                'tom': {'name': 'Tom', 'role': 'Grading'},
-                'sarah': {'name': 'Sarah', 'role': 'Electrical'},
-                'john': {'name': 'John', 'role': 'General'}
-            },
-            'job_types': {
-                'plumbing': {'name': 'Plumbing', 'keywords': ['plumb', 'pipe', 'water', 'leak', 'faucet', 'valve']},
-                'electrical': {'name': 'Electrical', 'keywords': ['electric', 'wire', 'power', 'outlet', 'breaker', 'panel']},
-                'grading': {'name': 'Grading', 'keywords': ['grade', 'level', 'excavat', 'dirt', 'soil', 'slope']},
-                'concrete': {'name': 'Concrete', 'keywords': ['concrete', 'pour', 'slab', 'foundation', 'cement']},
-                'framing': {'name': 'Framing', 'keywords': ['frame', 'wall', 'roof', 'truss', 'stud']},
-                'safety': {'name': 'Safety', 'keywords': ['safety', 'danger', 'hazard', 'violation', 'osha']},
-                'inspection': {'name': 'Inspection', 'keywords': ['inspect', 'review', 'check', 'permit']}
-            },
-            'projects': {}  # Will store created projects
-        }
+        return default_settings()
+
+class JSONSettingsStore:
+    """Legacy settings.json backend - atomic replace, file mtime as the version"""
+
+    name = 'json'
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def version(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return 0
+
+    def load(self):
+        return read_settings_file(), self.version()
+
+    def changes_since(self, version):
+        """No row-level history in a flat file - signal a full reload"""
+        return None
+
+    def _write(self, settings):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with tempfile.NamedTemporaryFile('w', dir=directory, delete=False, suffix='.tmp') as tmp:
+            json.dump(settings, tmp, indent=2)
+        os.replace(tmp.name, self.path)
+
+    def replace_all(self, settings):
+        with self._lock:
+            self._write(settings)
+
+    def set_item(self, section, key, value):
+        with self._lock:
+            settings = read_settings_file()
+            if section:
+                settings.setdefault(section, {})[key] = value
+            else:
+                settings[key] = value
+            self._write(settings)
+
+    def delete_item(self, section, key):
+        with self._lock:
+            settings = read_settings_file()
+            (settings.get(section, {}) if section else settings).pop(key, None)
+            self._write(settings)
+
+_forked_connections = []  # inherited from the parent process - kept open, never used
+
+def thread_connection(local):
+    """This thread's cached SQLite connection, or None if it must be (re)opened
+
+    A connection opened before a gunicorn --preload fork must not be used in
+    the child. Closing it could release locks the parent still relies on, so
+    it is only set aside.
+    """
+    conn = getattr(local, 'conn', None)
+    if conn is not None and getattr(local, 'pid', None) != os.getpid():
+        _forked_connections.append(conn)
+        local.conn = conn = None
+    return conn
+
+class SQLiteSettingsStore:
+    """SQLite (WAL) settings backend with row-level updates and a version counter"""
+
+    name = 'sqlite'
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = thread_connection(self._local)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS settings_items (
+                    section TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT,
+                    version INTEGER NOT NULL,
+                    deleted INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (section, key)
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_settings_version ON settings_items (version)')
+            conn.execute('CREATE TABLE IF NOT EXISTS settings_meta '
+                         '(id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)')
+            conn.execute('INSERT OR IGNORE INTO settings_meta (id, version) VALUES (1, 0)')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _rows(settings):
+        """Flatten a settings dict into (section, key, value) rows"""
+        for top_key, top_value in settings.items():
+            if top_key in SETTINGS_SECTIONS and isinstance(top_value, dict):
+                for key, value in top_value.items():
+                    yield top_key, key, value
+            else:
+                yield '', top_key, top_value
+
+    def version(self):
+        return self._conn().execute('SELECT version FROM settings_meta WHERE id = 1').fetchone()[0]
+
+    def load(self):
+        """Full read; the first load seeds the database from settings.json"""
+        conn = self._conn()
+        if self.version() == 0:
+            self.replace_all(read_settings_file())
+
+        conn.execute('BEGIN')
+        try:
+            version = self.version()
+            rows = conn.execute(
+                'SELECT section, key, value FROM settings_items WHERE deleted = 0'
+            ).fetchall()
+        finally:
+            conn.execute('COMMIT')
+
+        settings = {section: {} for section in SETTINGS_SECTIONS}
+        for section, key, value in rows:
+            if section:
+                settings.setdefault(section, {})[key] = json.loads(value)
+            else:
+                settings[key] = json.loads(value)
+        return settings, version
+
+    def changes_since(self, version):
+        """Rows written after the given version: (version, [(section, key, value or None)])"""
+        conn = self._conn()
+        conn.execute('BEGIN')
+        try:
+            current = self.version()
+            rows = conn.execute(
+                'SELECT section, key, value, deleted FROM settings_items WHERE version > ?',
+                (version,)
+            ).fetchall() if current != version else []
+        finally:
+            conn.execute('COMMIT')
+        return current, [(section, key, None if deleted else json.loads(value))
+                         for section, key, value, deleted in rows]
+
+    def _write(self, fn):
+        """Run fn(conn, new_version) in one write transaction"""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            new_version = self.version() + 1
+            fn(conn, new_version)
+            conn.execute('UPDATE settings_meta SET version = ? WHERE id = 1', (new_version,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _upsert(self, conn, version, section, key, value):
+        conn.execute(
+            'INSERT INTO settings_items (section, key, value, version, deleted) VALUES (?, ?, ?, ?, 0) '
+            'ON CONFLICT (section, key) DO UPDATE SET value = excluded.value, '
+            'version = excluded.version, deleted = 0',
+            (section, key, json.dumps(value), version)
+        )
+
+    def replace_all(self, settings):
+        """Atomically replace everything (tombstones let other workers see deletions)"""
+        def apply(conn, version):
+            conn.execute('UPDATE settings_items SET deleted = 1, version = ? WHERE deleted = 0', (version,))
+            for section, key, value in self._rows(settings):
+                self._upsert(conn, version, section, key, value)
+        self._write(apply)
+
+    def set_item(self, section, key, value):
+        self._write(lambda conn, version: self._upsert(conn, version, section, key, value))
+
+    def delete_item(self, section, key):
+        self._write(lambda conn, version: conn.execute(
+            'UPDATE settings_items SET deleted = 1, version = ? WHERE section = ? AND key = ?',
+            (version, section, key)
+        ))
+
+if SETTINGS_BACKEND == 'json':
+    settings_store = JSONSettingsStore(SETTINGS_FILE)
+else:
+    settings_store = SQLiteSettingsStore(SETTINGS_DB)
+
+_settings_lock = threading.Lock()
+SETTINGS_VERSION = None
+
+def load_settings():
+    """Load the full settings dict from the store"""
+    global SETTINGS_VERSION
+    settings, SETTINGS_VERSION = settings_store.load()
+    return settings
+
+def refresh_settings():
+    """Pick up changes made by other workers (cheap when nothing changed)
+
+    SETTINGS is swapped copy-on-write, so code iterating the old dict is
+    never disturbed by a refresh.
+    """
+    global SETTINGS, SETTINGS_VERSION
+    with _settings_lock:
+        changes = settings_store.changes_since(SETTINGS_VERSION)
+        if changes is None:
+            if settings_store.version() != SETTINGS_VERSION:
+                SETTINGS = load_settings()
+            return
+        
+        version, rows = changes
+        if version == SETTINGS_VERSION:
+            return
+        
+        updated = dict(SETTINGS)
+        copied = set()
+        for section, key, value in rows:
+            if not section:
+                if value is None:
+                    updated.pop(key, None)
+                else:
+                    updated[key] = value
+                continue
+            if section not in copied:
+                updated[section] = dict(updated.get(section, {}))
+                copied.add(section)
+            if value is None:
+                updated[section].pop(key, None)
+            else:
+                updated[section][key] = value
+        
+        SETTINGS = updated
+        SETTINGS_VERSION = version
 
 def save_settings(settings):
-    """Save settings to file"""
+    """Atomically replace all settings"""
     try:
-        with open(SETTINGS_FILE, 'w') as f:
-            json.dump(settings, f, indent=2)
+        settings_store.replace_all(settings)
+        refresh_settings()
         return True
     except Exception as e:
         print(f"Error saving settings: {e}")
         return False
 
+def save_setting(section, key, value):
+    """Row-level update of a single settings entry (e.g. one project)"""
+    try:
+        settings_store.set_item(section, key, value)
+        refresh_settings()
+        return True
+    except Exception as e:
+        print(f"Error saving setting {section}.{key}: {e}")
+        return False
+
 # Load initial settings
 SETTINGS = load_settings()
 
 def sync_clickup_lists_on_startup():
-    """Sync ClickUp lists with local settings on startup"""
+    """Sync ClickUp lists with local settings on startup; returns True on success"""
     if not CLICKUP_KEY or not WORKSPACE_ID:
         print("⚠️  ClickUp not configured - skipping sync")
-        return
-    
-    headers = {
-        'Authorization': CLICKUP_KEY,
-        'Content-Type': 'application/json'
-    }
+        return False
     
     try:
         print("🔄 Syncing with ClickUp lists...")
         
-        # Get all spaces first
-        space_response = requests.get(
-            f'{BASE_URL}/team/{WORKSPACE_ID}/space',
-            headers=headers,
-            params={'archived': 'false'},
-            timeout=10
-        )
-        
-        if space_response.status_code != 200:
-            print(f"⚠️  Could not fetch spaces: {space_response.status_code}")
-            return
-        
-        spaces = space_response.json().get('spaces', [])
+        # Spaces and lists come from the shared topology cache
+        spaces = workspace_topology.get_spaces()
         
         # Get lists from each space
         synced_count = 0
         for space in spaces:
-            space_id = space['id']
             space_name = space['name']
             
-            # Get lists in this space
-            list_response = requests.get(
-                f'{BASE_URL}/space/{space_id}/list',
-                headers=headers,
-                params={'archived': 'false'},
-                timeout=10
-            )
-            
-            if list_response.status_code == 200:
-                lists = list_response.json().get('lists', [])
+            for lst in space['lists']:
+                # Create simple key from first word of list name
+                list_name = lst['name']
+                simple_key = list_name.lower().split()[0] if list_name else 'unnamed'
                 
-                for lst in lists:
-                    # Create simple key from first word of list name
-                    list_name = lst['name']
-                    simple_key = list_name.lower().split()[0] if list_name else 'unnamed'
-                    
-                    # Handle duplicates by adding number
-                    original_key = simple_key
-                    counter = 1
-                    while simple_key in SETTINGS['projects']:
-                        # Check if it's the same list ID (already synced)
-                        if SETTINGS['projects'][simple_key].get('list_id') == lst['id']:
-                            break
-                        simple_key = f"{original_key}{counter}"
-                        counter += 1
-                    
-                    # Add or update project
-                    if simple_key not in SETTINGS['projects'] or SETTINGS['projects'][simple_key].get('list_id') != lst['id']:
-                        SETTINGS['projects'][simple_key] = {
-                            'list_id': lst['id'],
-                            'name': list_name,
-                            'space': space_name,
-                            'created': lst.get('date_created', ''),
-                            'synced': datetime.now().isoformat()
-                        }
-                        synced_count += 1
-                        print(f"  ✅ Synced: {list_name} (use '{simple_key}:' for tasks)")
-        
-        # Save the synced settings
-        save_settings(SETTINGS)
+                # Handle duplicates by adding number
+                original_key = simple_key
+                counter = 1
+                while simple_key in SETTINGS['projects']:
+                    # Check if it's the same list ID (already synced)
+                    if SETTINGS['projects'][simple_key].get('list_id') == lst['id']:
+                        break
+                    simple_key = f"{original_key}{counter}"
+                    counter += 1
+                
+                # Add or update project
+                if simple_key not in SETTINGS['projects'] or SETTINGS['projects'][simple_key].get('list_id') != lst['id']:
+                    save_setting('projects', simple_key, {
+                        'list_id': lst['id'],
+                        'name': list_name,
+                        'space': space_name,
+                        'created': lst.get('date_created', ''),
+                        'synced': datetime.now().isoformat()
+                    })
+                    synced_count += 1
+                    print(f"  ✅ Synced: {list_name} (use '{simple_key}:' for tasks)")
+        
+        # Projects were saved row by row above
+        if synced_count:
+            invalidate_default_list()
         
         print(f"✅ Sync complete! {synced_count} lists added/updated")
         print(f"📊 Total projects available: {len(SETTINGS['projects'])}")
+        return True
         
     except Exception as e:
         print(f"⚠️  Error syncing with ClickUp: {e}")
         print("   Continuing with existing settings...")
+        return False
+
+# Startup sync coordination - one worker syncs, the rest wait and reload
+SYNC_LOCK_FILE = os.getenv('SYNC_LOCK_FILE', 'clickup_sync.lock')
+SYNC_FRESH_SECONDS = int(os.getenv('SYNC_FRESH_SECONDS', '300'))
+SYNC_STATE = {'status': 'pending', 'role': None, 'started': None, 'finished': None}
+
+def run_startup_sync():
+    """Sync once per deployment using a file lock for leader election"""
+    SYNC_STATE['started'] = time.time()
+    SYNC_STATE['status'] = 'running'
+    
+    if fcntl is None:
+        SYNC_STATE['role'] = 'leader'
+        SYNC_STATE['status'] = 'done' if sync_clickup_lists_on_startup() else 'failed'
+        SYNC_STATE['finished'] = time.time()
+        return
+    
+    try:
+        with open(SYNC_LOCK_FILE, 'a+') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                SYNC_STATE['role'] = 'leader'
+            except OSError:
+                # Another worker is syncing - wait for it in the background
+                SYNC_STATE['role'] = 'follower'
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            
+            try:
+                lock_file.seek(0)
+                last_sync = float(lock_file.read().strip() or 0)
+                
+                if time.time() - last_sync < SYNC_FRESH_SECONDS:
+                    # Someone already synced this deployment - just pick up the result
+                    refresh_settings()
+                    SYNC_STATE['status'] = 'reused'
+                else:
+                    SYNC_STATE['role'] = 'leader'
+                    if sync_clickup_lists_on_startup():
+                        lock_file.seek(0)
+                        lock_file.truncate()
+                        lock_file.write(str(time.time()))
+                        lock_file.flush()
+                        SYNC_STATE['status'] = 'done'
+                    else:
+                        # No stamp, so the next worker to start tries again
+                        SYNC_STATE['status'] = 'failed'
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    except Exception as e:
+        print(f"⚠️  Startup sync error: {e}")
+        SYNC_STATE['status'] = 'error'
+    
+    SYNC_STATE['finished'] = time.time()
+
+def run_startup_sync_and_warm():
+    run_startup_sync()
+    # Projects are known now - load the task index before the first "done"
+    if CLICKUP_KEY and WORKSPACE_ID:
+        task_index.warm()
+
+def start_background_sync():
+    """Kick off the startup sync without blocking worker boot"""
+    thread = threading.Thread(target=run_startup_sync_and_warm, name='clickup-sync', daemon=True)
+    thread.start()
+    return thread
 
 # Configuration from environment variables
 CLICKUP_KEY = os.getenv('CLICKUP_API_KEY', '')
 WORKSPACE_ID = os.getenv('WORKSPACE_ID', '')
 BASE_URL = 'https://api.clickup.com/api/v2'
 
+# ClickUp HTTP connection pool / retry tuning
+CLICKUP_POOL_SIZE = int(os.getenv('CLICKUP_POOL_SIZE', '10'))
+CLICKUP_MAX_RETRIES = int(os.getenv('CLICKUP_MAX_RETRIES', '3'))
+CLICKUP_RETRY_BACKOFF = float(os.getenv('CLICKUP_RETRY_BACKOFF', '0.5'))
+
+# ClickUp rate limiting - one token bucket shared by every worker through SQLite
+CLICKUP_RATE_LIMIT = int(os.getenv('CLICKUP_RATE_LIMIT', '100'))  # requests per minute
+CLICKUP_RATE_DB = os.getenv('CLICKUP_RATE_DB', 'clickup_rate.db')
+CLICKUP_MAX_429_RETRIES = int(os.getenv('CLICKUP_MAX_429_RETRIES', '2'))
+
+# Per priority: share of the bucket held back for higher priorities, and the
+# longest a request queues for a token before it is sent anyway. Safety and
+# write requests can run inside Twilio's 15s webhook, so their waits stay short
+SAFETY_RATE_RESERVE = float(os.getenv('SAFETY_RATE_RESERVE', '0.05'))  # held back for safety tasks
+RATE_PRIORITIES = {
+    'safety': {'reserve': 0.0, 'max_wait': float(os.getenv('CLICKUP_SAFETY_MAX_WAIT', '5'))},
+    'write': {'reserve': SAFETY_RATE_RESERVE, 'max_wait': float(os.getenv('CLICKUP_WRITE_MAX_WAIT', '5'))},
+    'read': {'reserve': SAFETY_RATE_RESERVE + 0.1, 'max_wait': float(os.getenv('CLICKUP_READ_MAX_WAIT', '5'))},
+    'background': {'reserve': SAFETY_RATE_RESERVE + 0.3, 'max_wait': float(os.getenv('CLICKUP_BACKGROUND_MAX_WAIT', '60'))},
+}
+
+_clickup_priority = threading.local()
+
+@contextmanager
+def clickup_priority(priority):
+    """Run ClickUp calls made by this thread at the given rate-limit priority"""
+    previous = getattr(_clickup_priority, 'value', None)
+    _clickup_priority.value = priority
+    try:
+        yield
+    finally:
+        _clickup_priority.value = previous
+
+def current_clickup_priority():
+    return getattr(_clickup_priority, 'value', None)
+
+class ClickUpRateLimiter:
+    """Token bucket shared across workers, corrected from ClickUp's rate-limit headers
+
+    Lower priorities can't dip into the share of the bucket reserved for
+    higher ones, so background syncs and scans back off first.
+    """
+
+    def __init__(self, db_path, per_minute):
+        self.db_path = db_path
+        self.per_minute = per_minute
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.counters = {'acquired': 0, 'waited': 0, 'wait_ms': 0.0, 'wait_expired': 0,
+                         'throttled_429': 0, 'retried_429': 0, 'returned_429': 0}
+
+    def _conn(self):
+        conn = thread_connection(self._local)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS rate_bucket (id INTEGER PRIMARY KEY CHECK (id = 1), '
+                         'tokens REAL, capacity REAL, updated REAL, blocked_until REAL)')
+            conn.execute('INSERT OR IGNORE INTO rate_bucket (id, tokens, capacity, updated, blocked_until) '
+                         'VALUES (1, ?, ?, ?, 0)', (self.per_minute, self.per_minute, time.time()))
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def _try_take(self, reserve):
+        """Take a token if one is free above the reserve; else seconds to wait"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            tokens, capacity, updated, blocked_until = conn.execute(
+                'SELECT tokens, capacity, updated, blocked_until FROM rate_bucket WHERE id = 1'
+            ).fetchone()
+            rate = capacity / 60.0
+            tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+            floor = 1 + reserve * capacity
+            if now < blocked_until:
+                wait = blocked_until - now
+            elif tokens >= floor:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (floor - tokens) / rate
+            conn.execute('UPDATE rate_bucket SET tokens = ?, updated = ? WHERE id = 1', (tokens, now))
+            conn.execute('COMMIT')
+            return wait
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def deadline(self, priority):
+        """Latest time a request of this priority should still be waiting for a token"""
+        return time.time() + RATE_PRIORITIES.get(priority, RATE_PRIORITIES['read'])['max_wait']
+
+    def acquire(self, priority='read', deadline=None):
+        """Wait (bounded by the priority's max_wait, or deadline) for a token"""
+        policy = RATE_PRIORITIES.get(priority, RATE_PRIORITIES['read'])
+        started = time.time()
+        deadline = deadline or started + policy['max_wait']
+        while True:
+            try:
+                wait = self._try_take(policy['reserve'])
+            except Exception as e:
+                # Limiter trouble must never block ClickUp calls
+                print(f"Rate limiter error: {e}")
+                return
+            if wait <= 0:
+                break
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                print(f"⚠️  No ClickUp rate budget after {policy['max_wait']}s - sending {priority} request anyway")
+                self.count('wait_expired')
+                break
+            time.sleep(min(wait, remaining, 1.0))
+        
+        waited_ms = (time.time() - started) * 1000
+        self.count('acquired')
+        if waited_ms >= 1:
+            self.count('waited')
+            self.count('wait_ms', waited_ms)
+
+    def observe(self, response):
+        """Sync the bucket with X-RateLimit-* headers and back off on a 429"""
+        headers = response.headers
+        try:
+            limit = headers.get('X-RateLimit-Limit')
+            remaining = headers.get('X-RateLimit-Remaining')
+            reset = headers.get('X-RateLimit-Reset')
+            blocked_until = None
+            if response.status_code == 429:
+                self.count('throttled_429')
+                retry_after = headers.get('Retry-After')
+                if reset:
+                    blocked_until = float(reset)
+                elif retry_after:
+                    blocked_until = time.time() + float(retry_after)
+                else:
+                    blocked_until = time.time() + 60
+            elif remaining is not None and int(remaining) <= 0 and reset:
+                blocked_until = float(reset)
+            
+            if limit is None and remaining is None and blocked_until is None:
+                return None
+            
+            conn = self._conn()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if limit is not None:
+                    conn.execute('UPDATE rate_bucket SET capacity = ? WHERE id = 1', (float(limit),))
+                if remaining is not None:
+                    # The server's count wins when it is lower than ours
+                    conn.execute('UPDATE rate_bucket SET tokens = MIN(tokens, ?) WHERE id = 1', (float(remaining),))
+                if blocked_until is not None:
+                    conn.execute('UPDATE rate_bucket SET tokens = 0, updated = ?, '
+                                 'blocked_until = MAX(blocked_until, ?) WHERE id = 1',
+                                 (time.time(), blocked_until))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            return blocked_until
+        except Exception as e:
+            print(f"Rate limiter error: {e}")
+            return None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats['wait_ms'] = round(stats['wait_ms'])
+        try:
+            tokens, capacity, updated, blocked_until = self._conn().execute(
+                'SELECT tokens, capacity, updated, blocked_until FROM rate_bucket WHERE id = 1'
+            ).fetchone()
+            now = time.time()
+            stats.update({
+                'capacity_per_minute': capacity,
+                'tokens': round(min(capacity, tokens + max(0.0, now - updated) * capacity / 60.0), 1),
+                'blocked_for_s': round(max(0.0, blocked_until - now), 1)
+            })
+        except Exception as e:
+            stats['error'] = str(e)
+        return stats
+
+class MultipartFileStream:
+    """File-like multipart/form-data body for a single file field
+
+    requests reads it in blocks and sends a Content-Length, so the upload
+    never holds more than one block of the file in memory.
+    """
+
+    def __init__(self, field, filename, content_type, fileobj, size):
+        boundary = uuid.uuid4().hex
+        head = (f'--{boundary}\r\n'
+                f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+                f'Content-Type: {content_type}\r\n\r\n').encode()
+        tail = f'\r\n--{boundary}--\r\n'.encode()
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        self._head, self._file, self._tail = head, fileobj, tail
+        self._length = len(head) + size + len(tail)
+        self.rewind()
+
+    def rewind(self):
+        """Start the body over, for resending after a 429"""
+        self._file.seek(0)
+        self._parts = [BytesIO(self._head), self._file, BytesIO(self._tail)]
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        chunks = []
+        while self._parts and (size < 0 or size > 0):
+            chunk = self._parts[0].read(size)
+            if not chunk:
+                self._parts.pop(0)
+                continue
+            chunks.append(chunk)
+            if size > 0:
+                size -= len(chunk)
+        return b''.join(chunks)
+
+class ClickUpClient:
+    """Shared ClickUp API client with a pooled keep-alive session per worker"""
+
+    def __init__(self, api_key, base_url, pool_size=10, max_retries=3, backoff=0.5, limiter=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.limiter = limiter
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _build_session(self):
+        """Create a session with a sized connection pool and retry budget"""
+        session = requests.Session()
+        session.headers.update({
+            'Authorization': self.api_key,
+            'Content-Type': 'application/json'
+        })
+
+        # Only idempotent methods are retried automatically - a retried POST
+        # could create a duplicate task. 429s are left to the rate limiter, so
+        # Retry-After must not trigger a retry (or a sleep) down here
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=self.max_retries,
+            backoff_factor=self.backoff,
+            status_forcelist=[500, 502, 503, 504],
+            allowed_methods=frozenset(['GET', 'PUT', 'DELETE', 'HEAD', 'OPTIONS']),
+            respect_retry_after_header=False,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=retry
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    @property
+    def session(self):
+        """Session for the current process (rebuilt after a gunicorn fork)"""
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    self._session = self._build_session()
+                    self._pid = pid
+        return self._session
+
+    def request(self, method, path, timeout=10, priority=None, **kwargs):
+        """Send a request to the ClickUp API and return the raw response
+
+        priority is 'safety', 'write', 'read' or 'background' (default: the
+        thread's clickup_priority, else by method). A 429 was not processed
+        by ClickUp, so it is resent once the limit resets - unless that is
+        past the priority's max_wait, when the 429 is returned instead.
+        """
+        url = path if path.startswith('http') else f'{self.base_url}{path}'
+        if self.limiter is None:
+            return self.session.request(method, url, timeout=timeout, **kwargs)
+        
+        priority = priority or current_clickup_priority() or ('read' if method == 'GET' else 'write')
+        deadline = self.limiter.deadline(priority)
+        for attempt in range(CLICKUP_MAX_429_RETRIES + 1):
+            self.limiter.acquire(priority, deadline)
+            response = self.session.request(method, url, timeout=timeout, **kwargs)
+            blocked_until = self.limiter.observe(response)
+            if response.status_code != 429 or attempt == CLICKUP_MAX_429_RETRIES:
+                return response
+            if not blocked_until or blocked_until > deadline:
+                # acquire would give up before the reset and resend into the block
+                print(f"⏳ ClickUp 429 on {method} {path} - limit resets after the {priority} wait budget")
+                self.limiter.count('returned_429')
+                return response
+            
+            body = kwargs.get('data')
+            if body is not None and not isinstance(body, (bytes, str, dict)):
+                if not hasattr(body, 'rewind'):
+                    return response
+                body.rewind()
+            print(f"⏳ ClickUp 429 on {method} {path} - retrying after the limit resets")
+            self.limiter.count('retried_429')
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+    def upload_stream(self, path, fileobj, size, filename, content_type, field='attachment', timeout=15):
+        """Multipart upload that streams fileobj instead of building the body in memory"""
+        body = MultipartFileStream(field, filename, content_type, fileobj, size)
+        return self.request('POST', path, timeout=timeout, data=body,
+                            headers={'Content-Type': body.content_type})
+
+clickup = ClickUpClient(
+    CLICKUP_KEY,
+    BASE_URL,
+    pool_size=CLICKUP_POOL_SIZE,
+    max_retries=CLICKUP_MAX_RETRIES,
+    backoff=CLICKUP_RETRY_BACKOFF,
+    limiter=ClickUpRateLimiter(CLICKUP_RATE_DB, CLICKUP_RATE_LIMIT)
+)
+
+# Workspace topology (spaces, folders, lists) cached on disk
+TOPOLOGY_CACHE_FILE = os.getenv('TOPOLOGY_CACHE_FILE', 'clickup_topology.json')
+TOPOLOGY_TTL = int(os.getenv('TOPOLOGY_TTL', '3600'))
+TOPOLOGY_FETCH_CONCURRENCY = int(os.getenv('TOPOLOGY_FETCH_CONCURRENCY', '4'))
+
+class WorkspaceTopology:
+    """Disk-backed cache of ClickUp spaces, folders and lists with TTL revalidation"""
+
+    def __init__(self, path, ttl=3600, concurrency=4):
+        self.path = path
+        self.ttl = ttl
+        self.concurrency = concurrency
+        self._lock = threading.RLock()
+        self._data = None
+
+    def _empty(self):
+        return {'fetched_at': 0, 'hash': None, 'resources': {}, 'spaces': []}
+
+    def _load(self):
+        if self._data is None:
+            try:
+                with open(self.path, 'r') as f:
+                    self._data = json.load(f)
+            except Exception:
+                self._data = self._empty()
+        return self._data
+
+    def _save(self):
+        """Atomic write so a crash never leaves a half-written cache"""
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            with tempfile.NamedTemporaryFile('w', dir=directory, delete=False, suffix='.tmp') as tmp:
+                json.dump(self._data, tmp)
+            os.replace(tmp.name, self.path)
+        except Exception as e:
+            print(f"Error saving topology cache: {e}")
+
+    def _fetch(self, resources, key, path, timeout):
+        """GET a resource, revalidating with the stored ETag when there is one"""
+        cached = self._load()['resources'].get(key)
+        headers = {}
+        if cached and cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+
+        response = clickup.get(path, params={'archived': 'false'}, headers=headers, timeout=timeout,
+                              priority='background')
+        if response.status_code == 304 and cached:
+            resources[key] = cached
+            return cached['body']
+        if response.status_code != 200:
+            raise RuntimeError(f'{path} returned {response.status_code}')
+
+        body = response.json()
+        resources[key] = {'etag': response.headers.get('ETag'), 'body': body}
+        return body
+
+    @staticmethod
+    def _digest(spaces):
+        return hashlib.sha256(json.dumps(spaces, sort_keys=True).encode()).hexdigest()
+
+    @staticmethod
+    def _slim_list(lst):
+        return {'id': lst['id'], 'name': lst.get('name', ''), 'date_created': lst.get('date_created', '')}
+
+    def refresh(self, timeout=10):
+        """Re-fetch the topology; returns True if anything changed"""
+        with self._lock:
+            old = self._load()
+            resources = {}
+            raw_spaces = self._fetch(resources, 'spaces', f'/team/{WORKSPACE_ID}/space', timeout).get('spaces', [])
+
+            def fetch_space(space):
+                lists = self._fetch(resources, f"lists:{space['id']}",
+                                    f"/space/{space['id']}/list", timeout).get('lists', [])
+                folders = self._fetch(resources, f"folders:{space['id']}",
+                                      f"/space/{space['id']}/folder", timeout).get('folders', [])
+                return {
+                    'id': space['id'],
+                    'name': space.get('name', ''),
+                    'lists': [self._slim_list(lst) for lst in lists],
+                    'folders': [{
+                        'id': folder['id'],
+                        'name': folder.get('name', ''),
+                        'lists': [self._slim_list(lst) for lst in folder.get('lists', [])]
+                    } for folder in folders]
+                }
+
+            # Per-space fetches run concurrently; map() keeps the space order
+            if raw_spaces:
+                workers = max(1, min(self.concurrency, len(raw_spaces)))
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    spaces = list(pool.map(fetch_space, raw_spaces))
+            else:
+                spaces = []
+
+            digest = self._digest(spaces)
+            changed = digest != old.get('hash')
+            self._data = {'fetched_at': time.time(), 'hash': digest,
+                          'resources': resources, 'spaces': spaces}
+            self._save()
+            return changed
+
+    def get_spaces(self, force=False, timeout=10):
+        """Spaces with their lists, served from cache while within the TTL"""
+        with self._lock:
+            data = self._load()
+            if force or time.time() - data.get('fetched_at', 0) > self.ttl:
+                try:
+                    self.refresh(timeout=timeout)
+                except Exception:
+                    # Serve stale topology rather than failing if we have any
+                    if not data.get('spaces'):
+                        raise
+                    print("⚠️  Topology refresh failed - using cached copy")
+            return self._data['spaces']
+
+    def add_list(self, space_id, lst):
+        """Record a list we just created without a full refresh"""
+        with self._lock:
+            for space in self._load()['spaces']:
+                if space['id'] == space_id:
+                    space['lists'].append(self._slim_list(lst))
+                    self._data['resources'].pop(f'lists:{space_id}', None)
+                    self._data['hash'] = self._digest(self._data['spaces'])
+                    self._save()
+                    break
+
+    def stats(self):
+        data = self._load()
+        return {
+            'spaces': len(data.get('spaces', [])),
+            'lists': sum(len(s['lists']) + sum(len(f['lists']) for f in s.get('folders', []))
+                         for s in data.get('spaces', [])),
+            'fetched_at': data.get('fetched_at'),
+            'age_s': round(time.time() - data.get('fetched_at', 0), 1),
+            'hash': data.get('hash')
+        }
+
+workspace_topology = WorkspaceTopology(
+    TOPOLOGY_CACHE_FILE,
+    ttl=TOPOLOGY_TTL,
+    concurrency=TOPOLOGY_FETCH_CONCURRENCY
+)
+
+# Shared secret for /api/admin endpoints (they are refused while this is unset)
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+
 # Twilio configuration
 TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID', '')
 TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN', '')
 TWILIO_PHONE_NUMBER = os.getenv('TWILIO_PHONE_NUMBER', '')
+# Reject /sms requests without a valid X-Twilio-Signature (needs TWILIO_AUTH_TOKEN).
+# Behind a proxy, set TWILIO_WEBHOOK_URL to the public URL configured in Twilio
+TWILIO_VALIDATE_SIGNATURE = os.getenv('TWILIO_VALIDATE_SIGNATURE', 'true').lower() in ('1', 'true', 'yes')
+TWILIO_WEBHOOK_URL = os.getenv('TWILIO_WEBHOOK_URL', '')
+
+# MMS media handling - bytes above the spool threshold go to a temp file
+MEDIA_SPOOL_MAX_MEMORY = int(os.getenv('MEDIA_SPOOL_MAX_MEMORY', str(1024 * 1024)))
+MEDIA_MAX_BYTES = int(os.getenv('MEDIA_MAX_BYTES', str(25 * 1024 * 1024)))
+MEDIA_CHUNK_SIZE = 64 * 1024
+MEDIA_CONCURRENCY = int(os.getenv('MEDIA_CONCURRENCY', '3'))  # per request
+
+# Optional photo downscaling before upload (needs Pillow)
+IMAGE_PROCESSING = os.getenv('IMAGE_PROCESSING', 'false').lower() in ('1', 'true', 'yes')
+IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', '2048'))
+IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', '82'))
+IMAGE_MIN_BYTES = int(os.getenv('IMAGE_MIN_BYTES', str(512 * 1024)))
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', '2'))
+
+# Process pools are started with spawn: forking a worker that has request,
+# SMS and sync threads running can leave a lock held forever in the child
+PROCESS_START_METHOD = os.getenv('PROCESS_START_METHOD', 'spawn')
+
+# Content-addressed media store - dedupes Twilio retries and re-forwarded photos
+MEDIA_CACHE_DIR = os.getenv('MEDIA_CACHE_DIR', 'media_cache')
+MEDIA_CACHE_DB = os.getenv('MEDIA_CACHE_DB', 'media_cache.db')
+MEDIA_CACHE_MAX_BYTES = int(os.getenv('MEDIA_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+# Voice transcription - bounded so a burst of voice notes can't pile up Whisper calls
+TRANSCRIBE_WORKERS = int(os.getenv('TRANSCRIBE_WORKERS', '2'))
+TRANSCRIBE_QUEUE_SIZE = int(os.getenv('TRANSCRIBE_QUEUE_SIZE', '8'))  # waiting beyond the workers
+TRANSCRIBE_TIMEOUT = float(os.getenv('TRANSCRIBE_TIMEOUT', '30'))
+TRANSCRIPT_CACHE_TTL = int(os.getenv('TRANSCRIPT_CACHE_TTL', str(7 * 24 * 3600)))
+AUDIO_DOWNLOAD_TIMEOUT = float(os.getenv('AUDIO_DOWNLOAD_TIMEOUT', '15'))
+
+# Speech-to-text backends, tried in order; unavailable ones are skipped.
+# 'local' runs faster-whisper (CTranslate2) on CPU and needs `pip install faster-whisper`
+STT_BACKENDS = [b.strip() for b in os.getenv('STT_BACKENDS', 'openai,local').split(',') if b.strip()]
+LOCAL_STT_MODEL = os.getenv('LOCAL_STT_MODEL', 'base.en')
+LOCAL_STT_COMPUTE_TYPE = os.getenv('LOCAL_STT_COMPUTE_TYPE', 'int8')
+LOCAL_STT_PROCESSES = int(os.getenv('LOCAL_STT_PROCESSES', '1'))
+LOCAL_STT_THREADS = int(os.getenv('LOCAL_STT_THREADS', '2'))  # CPU threads per process
+
+# Async SMS mode - acknowledge Twilio immediately and reply via the REST API
+SMS_ASYNC_MODE = os.getenv('SMS_ASYNC_MODE', 'false').lower() in ('1', 'true', 'yes')
+SMS_QUEUE_DB = os.getenv('SMS_QUEUE_DB', 'sms_queue.db')
+SMS_WORKERS = int(os.getenv('SMS_WORKERS', '4'))
+SMS_MAX_ATTEMPTS = int(os.getenv('SMS_MAX_ATTEMPTS', '3'))
+
+# Web chat punch lists - one task per line
+BATCH_MAX_LINES = int(os.getenv('BATCH_MAX_LINES', '100'))
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '6'))
+
+# Safety lane - accident and hazard reports skip ahead of everything else
+SAFETY_KEYWORDS = ('safety', 'danger', 'hazard', 'emergency', 'urgent', 'accident')
+SAFETY_WORKERS = int(os.getenv('SAFETY_WORKERS', '1'))  # async workers that only take safety jobs
+SAFETY_SLO_SECONDS = float(os.getenv('SAFETY_SLO_SECONDS', '10'))
+NORMAL_SLO_SECONDS = float(os.getenv('NORMAL_SLO_SECONDS', '30'))
+
+# Twilio retries slow webhooks - each MessageSid is processed once
+IDEMPOTENCY_DB = os.getenv('IDEMPOTENCY_DB', 'webhooks.db')
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', str(24 * 3600)))
+IDEMPOTENCY_LEASE = int(os.getenv('IDEMPOTENCY_LEASE', '300'))  # pending claims older than this are abandoned
+IDEMPOTENCY_WAIT = float(os.getenv('IDEMPOTENCY_WAIT', '12'))    # under Twilio's 15 s webhook timeout
 
 # OpenAI configuration - Using v0.28 syntax
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
-if OPENAI_API_KEY:
-    import openai
-    openai.api_key = OPENAI_API_KEY
-
-# Startup message
-print("=" * 60)
-print("🏗️  ClickUp Construction Assistant")
-print("=" * 60)
-print(f"📌 ClickUp: {'Connected' if CLICKUP_KEY else 'Not configured'}")
-print(f"🏢 Workspace: {WORKSPACE_ID if WORKSPACE_ID else 'Not configured'}")
-print(f"📱 SMS: {'Enabled' if TWILIO_ACCOUNT_SID else 'Not configured'}")
-print(f"🤖 OpenAI: {'Connected' if OPENAI_API_KEY else 'Not configured'}")
-print(f"🎤 Voice: {'Ready' if OPENAI_API_KEY else 'Not configured'}")
-print(f"📁 Settings: {SETTINGS_FILE}")
-print("=" * 60)
-
-# Sync ClickUp lists on startup (AFTER configuration is loaded)
-sync_clickup_lists_on_startup()
+_openai = None
+
+def get_openai():
+    """Import and configure the OpenAI SDK on first use"""
+    global _openai
+    if _openai is None:
+        import openai
+        openai.api_key = OPENAI_API_KEY
+        _openai = openai
+    return _openai
+
+# Deferred startup - nothing here runs at import time, so importing the
+# module (tests, gunicorn --preload) does no network I/O
+STARTUP_STATE = {'pid': None, 'started_at': None}
+_startup_lock = threading.Lock()
+
+def print_startup_banner():
+    """Startup message"""
+    print("=" * 60)
+    print("🏗️  ClickUp Construction Assistant")
+    print("=" * 60)
+    print(f"📌 ClickUp: {'Connected' if CLICKUP_KEY else 'Not configured'}")
+    print(f"🏢 Workspace: {WORKSPACE_ID if WORKSPACE_ID else 'Not configured'}")
+    print(f"📱 SMS: {'Enabled' if TWILIO_ACCOUNT_SID else 'Not configured'}")
+    print(f"🤖 OpenAI: {'Connected' if OPENAI_API_KEY else 'Not configured'}")
+    print(f"🎤 Voice: {'Ready' if OPENAI_API_KEY else 'Not configured'}")
+    print(f"📁 Settings: {SETTINGS_DB if settings_store.name == 'sqlite' else SETTINGS_FILE} ({settings_store.name})")
+    print(f"⏱️  Import: {IMPORT_MS} ms")
+    print("=" * 60)
+
+def ensure_started():
+    """Run once per worker process, on its first request (after any fork)"""
+    pid = os.getpid()
+    if STARTUP_STATE['pid'] == pid:
+        return
+    with _startup_lock:
+        if STARTUP_STATE['pid'] == pid:
+            return
+        STARTUP_STATE['pid'] = pid
+        STARTUP_STATE['started_at'] = time.time()
+        print_startup_banner()
+        
+        # Sync ClickUp lists in the background so this request isn't held up
+        start_background_sync()
+        
+        # Pick up SMS jobs left in the queue by a previous worker
+        if SMS_ASYNC_MODE:
+            ensure_sms_workers()
+        
+        # Load local speech-to-text models before the first voice note arrives
+        warm_transcribers()
+
+@app.before_request
+def _start_on_first_request():
+    ensure_started()
+    refresh_settings()
+
+def is_ready():
+    """Ready once the startup sync has finished (successfully or not)"""
+    return STARTUP_STATE['pid'] == os.getpid() and SYNC_STATE['status'] in ('done', 'reused', 'failed', 'error')
 
 # Main interface HTML with project creation support
 HTML_PAGE = """
@@ -474,12 +1379,13 @@ HTML_PAGE = """
             </div>
             
             <div class="input-group">
-                <input type="text" 
-                       class="input-field" 
-                       id="userInput" 
-                       placeholder="Create project or add task..." 
-                       autocomplete="off"
-                       onkeypress="if(event.key==='Enter') sendMessage()">
+                <textarea class="input-field" 
+                          id="userInput" 
+                          rows="1"
+                          style="resize: vertical; font-family: inherit;"
+                          placeholder="Create project or add task... (paste a list for one task per line)" 
+                          autocomplete="off"
+                          onkeydown="if(event.key==='Enter' && !event.shiftKey) { event.preventDefault(); sendMessage(); }"></textarea>
                 <button class="send-btn" onclick="sendMessage()">Send</button>
             </div>
         </div>
@@ -600,11 +1506,14 @@ HTML_PAGE = """
             const projectSelect = document.getElementById('projectSelect').value;
             const defaultAssignee = document.getElementById('defaultAssignee').value;
             
-            addMessage(msg, true);
+            addMessage(msg.replace(/\\n/g, '<br>'), true);
             input.value = '';
             
+            // Several lines = punch list, one task per line
+            const isBatch = msg.includes('\\n');
+            
             try {
-                const response = await fetch('/api/chat', {
+                const response = await fetch(isBatch ? '/api/chat/batch' : '/api/chat', {
                     method: 'POST',
                     headers: {'Content-Type': 'application/json'},
                     body: JSON.stringify({
@@ -625,7 +1534,7 @@ HTML_PAGE = """
                 // Update status
                 if (data.success) {
                     document.getElementById('status').innerHTML = data.project_created ? 
-                        '✅ Project created!' : '✅ Task created!';
+                        '✅ Project created!' : (isBatch ? `✅ ${data.created} tasks created!` : '✅ Task created!');
                     setTimeout(() => {
                         document.getElementById('status').innerHTML = '✅ Connected to ClickUp';
                     }, 3000);
@@ -865,6 +1774,12 @@ SETTINGS_PAGE = """
                 These projects have been created in ClickUp. Use the project keyword to route tasks.
             </div>
             <div class="item-list" id="projectList"></div>
+            <div class="help-text">
+                Default project for tasks that don't name one:
+                <select id="defaultProject" onchange="settings.default_list_id = this.value || null">
+                    <option value="">First list in workspace</option>
+                </select>
+            </div>
             
             <div class="section-title">👥 Team Members</div>
             <div class="help-text">
@@ -918,6 +1833,17 @@ SETTINGS_PAGE = """
                 }
             }
             
+            // Render default project picker
+            const defaultProject = document.getElementById('defaultProject');
+            defaultProject.innerHTML = '<option value="">First list in workspace</option>';
+            for (const [key, project] of Object.entries(settings.projects || {})) {
+                const option = document.createElement('option');
+                option.value = project.list_id;
+                option.textContent = project.name;
+                option.selected = project.list_id === settings.default_list_id;
+                defaultProject.appendChild(option);
+            }
+            
             if (Object.keys(settings.projects || {}).length === 0) {
                 projectList.innerHTML = '<p style="color: #666; font-style: italic;">No projects yet. Create one from the main page!</p>';
             }
@@ -1063,19 +1989,39 @@ def settings_page():
     """Serve the settings page"""
     return render_template_string(SETTINGS_PAGE)
 
+_settings_response = {'cached': None}  # (key, body, etag), swapped as a whole
+SETTINGS_READ_METRICS = {'served': 0, 'not_modified': 0, 'serialized': 0}
+
 @app.route('/api/settings', methods=['GET'])
 def get_settings():
-    """Get current settings"""
-    return jsonify(SETTINGS)
+    """Get current settings
+
+    The UI polls this every 30 s; the body is serialized once per settings
+    version and revalidated by ETag, so unchanged polls get a 304.
+    """
+    settings, key = SETTINGS, (SETTINGS_VERSION, id(SETTINGS))
+    cached = _settings_response['cached']
+    if not cached or cached[0] != key:
+        body = json.dumps(settings)
+        cached = (key, body, hashlib.sha1(body.encode()).hexdigest()[:16])
+        _settings_response['cached'] = cached
+        SETTINGS_READ_METRICS['serialized'] += 1
+    
+    headers = {'ETag': f'"{cached[2]}"', 'Cache-Control': 'no-cache'}
+    if cached[2] in request.if_none_match:
+        SETTINGS_READ_METRICS['not_modified'] += 1
+        return '', 304, headers
+    SETTINGS_READ_METRICS['served'] += 1
+    return app.response_class(cached[1], mimetype='application/json', headers=headers)
 
 @app.route('/api/settings', methods=['POST'])
 def update_settings():
     """Update settings"""
-    global SETTINGS
     try:
         new_settings = request.json
-        SETTINGS = new_settings
-        save_settings(SETTINGS)
+        if not save_settings(new_settings):
+            return jsonify({'success': False, 'error': 'Could not save settings'}), 500
+        invalidate_default_list()
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
@@ -1083,24 +2029,13 @@ def update_settings():
 def create_project_in_clickup_with_timeout(project_name, trades=None, timeout=8):
     """Create project with timeout protection"""
     
-    headers = {
-        'Authorization': CLICKUP_KEY,
-        'Content-Type': 'application/json'
-    }
-    
     try:
-        # Get space with timeout
-        space_response = requests.get(
-            f'{BASE_URL}/team/{WORKSPACE_ID}/space',
-            headers=headers,
-            params={'archived': 'false'},
-            timeout=timeout
-        )
-        
-        if space_response.status_code != 200:
+        # Get space from the topology cache
+        try:
+            spaces = workspace_topology.get_spaces(timeout=timeout)
+        except RuntimeError:
             return {'success': False, 'error': 'Could not find space'}
         
-        spaces = space_response.json().get('spaces', [])
         if not spaces:
             return {'success': False, 'error': 'No spaces found'}
         
@@ -1112,9 +2047,8 @@ def create_project_in_clickup_with_timeout(project_name, trades=None, timeout=8)
             'content': f'Project created via SMS'
         }
         
-        list_response = requests.post(
-            f'{BASE_URL}/space/{space_id}/list',
-            headers=headers,
+        list_response = clickup.post(
+            f'/space/{space_id}/list',
             json=list_data,
             timeout=timeout
         )
@@ -1124,18 +2058,16 @@ def create_project_in_clickup_with_timeout(project_name, trades=None, timeout=8)
         
         new_list = list_response.json()
         list_id = new_list['id']
+        workspace_topology.add_list(space_id, new_list)
         
         # Save to settings (quick operation)
         simple_name = project_name.lower().split()[0]
-        if 'projects' not in SETTINGS:
-            SETTINGS['projects'] = {}
-        
-        SETTINGS['projects'][simple_name] = {
+        save_setting('projects', simple_name, {
             'list_id': list_id,
             'name': project_name,
             'created': datetime.now().isoformat()
-        }
-        save_settings(SETTINGS)
+        })
+        invalidate_default_list()
         
         return {
             'success': True,
@@ -1151,18 +2083,86 @@ def create_project_in_clickup_with_timeout(project_name, trades=None, timeout=8)
         print(f"Error creating project: {e}")
         return {'success': False, 'error': str(e)}
 
-def detect_project_from_message(message):
+# Trade keywords recognised in "create project ... with water and sewer"
+TRADE_KEYWORDS = {
+    'water': 'Water',
+    'sewer': 'Sewer', 
+    'storm': 'Storm',
+    'grading': 'Grading',
+    'electrical': 'Electrical',
+    'concrete': 'Concrete',
+    'plumbing': 'Plumbing'
+}
+
+class KeywordMatcher:
+    """Single compiled regex over project keys/names, team members and trades"""
+
+    def __init__(self, settings):
+        self.terms = {}  # lowercase term -> list of (kind, id)
+        for key, project in settings.get('projects', {}).items():
+            self._add(key, 'project', key)
+            self._add(project.get('name'), 'project', key)
+        for key, member in settings.get('team_members', {}).items():
+            self._add(key, 'member', key)
+            self._add(member.get('name'), 'member', key)
+        for keyword, trade_name in TRADE_KEYWORDS.items():
+            self._add(keyword, 'trade', trade_name)
+
+        # Longest terms first so "oak street" wins over "oak" at the same spot;
+        # the lookarounds keep "oak" from matching inside "soak"
+        alternation = '|'.join(re.escape(term) for term in sorted(self.terms, key=len, reverse=True))
+        self.pattern = re.compile(rf'(?<![a-z0-9])(?:{alternation})(?![a-z0-9])') if alternation else None
+
+    def _add(self, term, kind, ident):
+        term = (term or '').strip().lower()
+        if term and (kind, ident) not in self.terms.setdefault(term, []):
+            self.terms[term].append((kind, ident))
+
+    def scan(self, message):
+        """All project/member/trade hits in one pass, in message order"""
+        hits = {'project': [], 'member': [], 'trade': []}
+        if not self.pattern:
+            return hits
+        seen = set()
+        for match in self.pattern.finditer(message.lower()):
+            for kind, ident in self.terms[match.group(0)]:
+                if (kind, ident) not in seen:
+                    seen.add((kind, ident))
+                    hits[kind].append((ident, match.start(), match.end()))
+        return hits
+
+_matcher_cache = {'key': None, 'matcher': None}
+
+def get_keyword_matcher():
+    """Matcher for the current settings, rebuilt only when they change"""
+    key = (SETTINGS_VERSION, id(SETTINGS))
+    if _matcher_cache['key'] != key:
+        _matcher_cache['matcher'] = KeywordMatcher(SETTINGS)
+        _matcher_cache['key'] = key
+    return _matcher_cache['matcher']
+
+def is_project_prefix(lower, start, end):
+    """True for "oak: ..." / "oak - ..." (ignoring a leading emoji like the photo marker)"""
+    return (not re.search(r'\w', lower[:start]) and
+            (lower[end:end + 1] == ':' or lower[end:end + 2] == ' -'))
+
+def detect_project_from_message(message, hits=None):
     """Detect which project a task belongs to"""
-    lower = message.lower()
+    # One snapshot - refresh_settings may swap SETTINGS while we look
+    projects = SETTINGS.get('projects', {})
+    if hits is None:
+        hits = get_keyword_matcher().scan(message)
     
-    # Check for project prefix patterns
-    for key, project in SETTINGS.get('projects', {}).items():
-        # Check for "project:" or "project -" format
-        if lower.startswith(key + ':') or lower.startswith(key + ' -'):
-            return project['list_id'], key
-        # Check if project name is mentioned
-        if key in lower:
-            return project['list_id'], key
+    # Prefer a "project:" or "project -" prefix, then the first mention
+    lower = message.lower()
+    for key, start, end in hits['project']:
+        project = projects.get(key)
+        if project and is_project_prefix(lower, start, end):
+            return project.get('list_id'), key
+    for key, start, end in hits['project']:
+        project = projects.get(key)
+        if project:
+            return project.get('list_id'), key
     
     return None, None
 
@@ -1206,14 +2206,18 @@ def parse_command_simple(message):
         'list_id': None
     }
     
+    # One pass finds assignee and project mentions
+    members = SETTINGS.get('team_members', {})
+    hits = get_keyword_matcher().scan(message)
+    
     # Check for assignee
-    for key, member in SETTINGS['team_members'].items():
-        if key.lower() in lower or member['name'].lower() in lower:
-            task_info['assignee'] = member['name']
-            break
+    if hits['member']:
+        member = members.get(hits['member'][0][0])
+        if member:
+            task_info['assignee'] = member.get('name')
     
     # Check for project
-    list_id, project_key = detect_project_from_message(message)
+    list_id, project_key = detect_project_from_message(message, hits)
     if list_id:
         task_info['list_id'] = list_id
         # Clean project prefix from name
@@ -1228,183 +2232,1441 @@ def parse_command_simple(message):
     
     return task_info
 
-# OpenAI integration functions
-def parse_with_openai(message):
-    """Use OpenAI to understand complex construction commands"""
-    if not OPENAI_API_KEY:
-        return None
-    
-    try:
-        # Get list of projects for context
-        project_list = ", ".join([f"{key} ({proj['name']})" for key, proj in SETTINGS.get('projects', {}).items()])
-        team_list = ", ".join([f"{member['name']} ({member['role']})" for member in SETTINGS['team_members'].values()])
-        
-        prompt = f"""You are parsing construction site text messages into structured commands.
-        
-Available projects (use the short key): {project_list}
-Team members: {team_list}
-
-Parse this message: "{message}"
-
-IMPORTANT RULES:
-- For task name: Create a clean, professional description WITHOUT the person's name in it
-- For assignee: Extract the person's name if mentioned (just their first name)
-- For priority: Set to 1 if urgent/asap/emergency/critical, otherwise 3
-- Words like "asap", "urgent", "now", "immediately" = priority 1
-- For project: Match to available project keys (oak, maple, etc.)
-
-Return a JSON object with:
-- type: "create_task" or "create_project"
-- name: Clean task description (NO PERSON NAMES in the task name)
-- assignee: Person's name if mentioned (optional)
-- project: Project key if detected (optional)
-- priority: 1 for urgent, 2 for high, 3 for normal, 4 for low
-- due_date: YYYY-MM-DD if mentioned (optional)
-
-Example input: "Mike found water damage at oak street needs fixing asap"
-Example output: {{"type": "create_task", "name": "Fix water damage", "assignee": "Mike", "project": "oak", "priority": 1}}
-"""
+# Small LRU + TTL cache used for parse results (optionally persisted to SQLite)
+class TTLCache:
+    """Thread-safe LRU cache with per-entry TTL, hit counters and in-flight dedupe"""
 
-        # Use v0.28 syntax
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": prompt},
-                {"role": "user", "content": message}
-            ],
-            temperature=0.3,
-            max_tokens=200
-        )
-        
-        result = json.loads(response.choices[0].message.content)
-        print(f"🤖 OpenAI parsed: {result}")
-        return result
-        
-    except Exception as e:
-        print(f"OpenAI parsing error: {e}")
+    def __init__(self, name, maxsize=1000, ttl=3600, db_path=None, track_keys=0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.db_path = db_path
+        self.track_keys = track_keys  # keep per-key counters for this many keys
+        self._data = OrderedDict()  # key -> (expires, value)
+        self._inflight = {}         # key -> threading.Event
+        self._key_counters = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.counters = {'hits': 0, 'misses': 0, 'persisted_hits': 0,
+                         'coalesced': 0, 'evictions': 0}
+
+    def _count_key(self, key, name):
+        """Per-key counter (caller holds the lock)"""
+        if not self.track_keys:
+            return
+        counters = self._key_counters.get(key)
+        if counters is None:
+            counters = self._key_counters[key] = {'hits': 0, 'misses': 0, 'coalesced': 0}
+            while len(self._key_counters) > self.track_keys:
+                self._key_counters.popitem(last=False)
+        self._key_counters.move_to_end(key)
+        counters[name] += 1
+
+    def _conn(self):
+        conn = thread_connection(self._local)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_entries (namespace TEXT, key TEXT, '
+                         'value TEXT, expires REAL, PRIMARY KEY (namespace, key))')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _get_local(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def _set_local(self, key, value, expires):
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    def get(self, key):
+        """Cached value or None"""
+        with self._lock:
+            entry = self._get_local(key)
+            if entry:
+                self.counters['hits'] += 1
+                self._count_key(key, 'hits')
+                return entry[1]
+
+        if self.db_path:
+            try:
+                row = self._conn().execute(
+                    'SELECT value, expires FROM cache_entries WHERE namespace = ? AND key = ? AND expires > ?',
+                    (self.name, key, time.time())
+                ).fetchone()
+                if row:
+                    value = json.loads(row[0])
+                    with self._lock:
+                        self._set_local(key, value, row[1])
+                        self.counters['hits'] += 1
+                        self.counters['persisted_hits'] += 1
+                        self._count_key(key, 'hits')
+                    return value
+            except Exception as e:
+                print(f"{self.name} cache read error: {e}")
+
+        with self._lock:
+            self.counters['misses'] += 1
+            self._count_key(key, 'misses')
         return None
 
-def handle_mms_image(media_url, message_text, from_number):
-    """Process MMS images and create tasks with attachments"""
-    try:
-        print(f"📸 Downloading image from: {media_url}")
-        
-        # Download image from Twilio URL
-        response = requests.get(
-            media_url,
-            auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN),
-            timeout=10
+    def set(self, key, value):
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._set_local(key, value, expires)
+        if self.db_path:
+            try:
+                self._conn().execute(
+                    'INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires) VALUES (?, ?, ?, ?)',
+                    (self.name, key, json.dumps(value), expires)
+                )
+            except Exception as e:
+                print(f"{self.name} cache write error: {e}")
+
+    def get_or_compute(self, key, compute, wait_timeout=30):
+        """Return the cached value, or compute it once even if called concurrently
+
+        None results are not cached.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+            else:
+                self.counters['coalesced'] += 1
+                self._count_key(key, 'coalesced')
+
+        if not leader:
+            # Identical request already running - wait for its result
+            event.wait(wait_timeout)
+            with self._lock:
+                entry = self._get_local(key)
+            return entry[1] if entry else None
+
+        try:
+            value = compute()
+            if value is not None:
+                self.set(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def invalidate_prefix(self, prefix):
+        """Drop every entry whose key starts with prefix"""
+        with self._lock:
+            for key in [key for key in self._data if key.startswith(prefix)]:
+                del self._data[key]
+        if self.db_path:
+            try:
+                self._conn().execute(
+                    'DELETE FROM cache_entries WHERE namespace = ? AND substr(key, 1, ?) = ?',
+                    (self.name, len(prefix), prefix)
+                )
+            except Exception as e:
+                print(f"{self.name} cache write error: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters['hits'] + self.counters['misses']
+            stats = dict(self.counters, size=len(self._data), maxsize=self.maxsize, ttl=self.ttl,
+                         hit_rate=round(self.counters['hits'] / lookups, 3) if lookups else None)
+            if self.track_keys:
+                stats['keys'] = {key: dict(counters) for key, counters in self._key_counters.items()}
+            return stats
+
+PARSE_CACHE_SIZE = int(os.getenv('PARSE_CACHE_SIZE', '1000'))
+PARSE_CACHE_TTL = int(os.getenv('PARSE_CACHE_TTL', '86400'))
+PARSE_CACHE_DB = os.getenv('PARSE_CACHE_DB', '')  # empty = memory only
+
+parse_cache = TTLCache('parse', maxsize=PARSE_CACHE_SIZE, ttl=PARSE_CACHE_TTL,
+                       db_path=PARSE_CACHE_DB or None)
+
+# Short-lived cache for ClickUp reads: identical concurrent GETs share one call
+CLICKUP_READ_TTL = float(os.getenv('CLICKUP_READ_TTL', '5'))
+clickup_read_cache = TTLCache('clickup_read', maxsize=500, ttl=CLICKUP_READ_TTL, track_keys=100)
+
+def clickup_read_key(path, params=None):
+    if not params:
+        return path
+    return f"{path}?{urlencode(sorted(params.items()), doseq=True)}"
+
+def cached_clickup_get(path, params=None, timeout=10, transform=None, variant=''):
+    """Parsed JSON for a ClickUp GET, or None on failure (failures are not cached)
+
+    transform reduces the response before it is cached; pass a variant name
+    so its results don't share a key with the untransformed response.
+    """
+    def fetch():
+        response = clickup.get(path, params=params, timeout=timeout)
+        if response.status_code != 200:
+            print(f"ClickUp GET {path} failed: {response.status_code}")
+            return None
+        data = response.json()
+        return transform(data) if transform else data
+    
+    key = clickup_read_key(path, params) + (f'#{variant}' if variant else '')
+    return clickup_read_cache.get_or_compute(key, fetch, wait_timeout=timeout)
+
+def invalidate_list_reads(list_id):
+    """Forget cached task reads for a list after we change its tasks"""
+    if list_id:
+        clickup_read_cache.invalidate_prefix(f'/list/{list_id}/task')
+
+def normalize_message(message):
+    """Collapse case/whitespace/trailing punctuation so resends share a cache key"""
+    return re.sub(r'\s+', ' ', message.lower()).strip().rstrip('.!?')
+
+def parse_context_hash():
+    """Hash of the project/team context the model sees"""
+    context = {
+        'projects': sorted((key, proj.get('name', '')) for key, proj in SETTINGS.get('projects', {}).items()),
+        'team': sorted((m.get('name', ''), m.get('role', '')) for m in SETTINGS.get('team_members', {}).values())
+    }
+    return hashlib.sha256(json.dumps(context).encode()).hexdigest()[:16]
+
+# OpenAI integration functions
+def parse_with_openai(message):
+    """Use OpenAI to understand complex construction commands (cached)"""
+    if not OPENAI_API_KEY:
+        return None
+    
+    # Date is part of the key so relative due dates don't go stale
+    key = f"{datetime.now().strftime('%Y-%m-%d')}|{parse_context_hash()}|{normalize_message(message)}"
+    result = parse_cache.get_or_compute(key, lambda: _parse_with_openai_uncached(message))
+    # Callers may modify the result - never hand out the cached object
+    return dict(result) if result else None
+
+# Compact prompt for the model - the context block is rendered once per
+# settings version and only candidate projects are sent
+PROMPT_MAX_PROJECTS = int(os.getenv('PROMPT_MAX_PROJECTS', '20'))
+
+PARSE_SYSTEM_PROMPT = """You turn construction site text messages into structured commands.
+- name: short professional task description, WITHOUT person names
+- assignee: first name of the person mentioned, if any
+- project: one of the listed project keys, only if the message refers to it
+- priority: 1 urgent/asap, 2 high, 3 normal, 4 low
+- due_date: YYYY-MM-DD, only if a date is mentioned"""
+
+_prompt_context_cache = {'key': None, 'team': '', 'projects': {}}
+
+PROMPT_METRICS = {'requests': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'last_prompt_tokens': None}
+
+def prompt_context():
+    """Rendered team line and per-project labels for the current settings"""
+    key = (SETTINGS_VERSION, id(SETTINGS))
+    if _prompt_context_cache['key'] != key:
+        _prompt_context_cache['team'] = "Team: " + ", ".join(
+            f"{member['name']} ({member['role']})" for member in SETTINGS['team_members'].values()
+        )
+        _prompt_context_cache['projects'] = {
+            key_: f"{key_} ({proj['name']})" for key_, proj in SETTINGS.get('projects', {}).items()
+        }
+        _prompt_context_cache['key'] = key
+    return _prompt_context_cache
+
+def build_parse_request(message):
+    """System prompt and function schema for one message"""
+    context = prompt_context()
+    
+    # Projects the matcher spotted; all of them only if the workspace is small
+    candidates = [key for key, start, end in get_keyword_matcher().scan(message)['project']]
+    if not candidates and len(context['projects']) <= PROMPT_MAX_PROJECTS:
+        candidates = list(context['projects'])
+    
+    today = datetime.now()
+    lines = [PARSE_SYSTEM_PROMPT, f"Today: {today.strftime('%Y-%m-%d (%A)')}", context['team']]
+    if candidates:
+        lines.append("Projects: " + ", ".join(context['projects'][key] for key in candidates))
+    
+    properties = {
+        'type': {'type': 'string', 'enum': ['create_task', 'create_project']},
+        'name': {'type': 'string'},
+        'assignee': {'type': 'string'},
+        'priority': {'type': 'integer', 'enum': [1, 2, 3, 4]},
+        'due_date': {'type': 'string', 'description': 'YYYY-MM-DD'}
+    }
+    if candidates:
+        properties['project'] = {'type': 'string', 'enum': candidates}
+    
+    function = {
+        'name': 'construction_command',
+        'description': 'Structured command parsed from a site text message',
+        'parameters': {'type': 'object', 'properties': properties, 'required': ['type', 'name']}
+    }
+    return "\n".join(lines), function
+
+def record_prompt_usage(usage):
+    """Token counts from the API response"""
+    if not usage:
+        return
+    with _parser_metrics_lock:
+        PROMPT_METRICS['requests'] += 1
+        PROMPT_METRICS['prompt_tokens'] += usage.get('prompt_tokens', 0)
+        PROMPT_METRICS['completion_tokens'] += usage.get('completion_tokens', 0)
+        PROMPT_METRICS['last_prompt_tokens'] = usage.get('prompt_tokens')
+
+def _parse_with_openai_uncached(message):
+    """Send one message to the model and return its parsed JSON"""
+    try:
+        system_prompt, function = build_parse_request(message)
+        
+        # Use v0.28 syntax - function calling forces a JSON argument object
+        started = time.perf_counter()
+        response = get_openai().ChatCompletion.create(
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": message}
+            ],
+            functions=[function],
+            function_call={"name": function['name']},
+            temperature=0.3,
+            max_tokens=200
         )
+        record_parser_metric('llm_call', (time.perf_counter() - started) * 1000)
         
-        print(f"Download status: {response.status_code}")
+        usage = response.get('usage')
+        record_prompt_usage(usage)
         
-        if response.status_code == 200:
-            image_data = response.content
-            print(f"✅ Image downloaded: {len(image_data)} bytes")
-            
-            # Create task with description mentioning the photo
-            task_description = f"📷 Photo attached\n{message_text}\nFrom: {from_number}"
-            
-            return {
-                'has_image': True,
-                'image_data': image_data,
-                'description': task_description,
-                'media_url': media_url  # Keep URL as backup
-            }
+        reply = response.choices[0].message
+        if reply.get('function_call'):
+            result = json.loads(reply['function_call']['arguments'])
         else:
-            print(f"❌ Failed to download image: {response.status_code}")
+            result = json.loads(reply.get('content') or '{}')
+        print(f"🤖 OpenAI parsed ({usage.get('prompt_tokens') if usage else '?'} prompt tokens): {result}")
+        return result
+        
+    except Exception as e:
+        print(f"OpenAI parsing error: {e}")
+        return None
+
+# Local rule-based parser tier - the LLM is only asked when this is unsure
+PARSER_CONFIDENCE_THRESHOLD = float(os.getenv('PARSER_CONFIDENCE_THRESHOLD', '0.75'))
+
+PROJECT_CREATION_RE = re.compile(r'\b(?:create|new|start|make)\s+(?:a\s+)?project\b')
+# Bare command words are never task names
+COMMAND_WORDS = {'done', 'complete', 'list', 'status', 'update', 'help', 'commands', 'menu'}
+TASK_LEAD_IN_RE = re.compile(
+    r'^(?:please\s+)?(?:(?:add|create|make|new)\s+(?:an?\s+)?(?:urgent\s+)?(?:task|todo)\s*)?'
+    r'(?:for\s*)?[:\-,]?\s*',
+    re.IGNORECASE
+)
+MEMBER_CONNECTOR_RE = r'(?:\s+(?:needs to|need to|has to|should|will|to)\b|\s*[:,\-])?'
+# Date-ish words left over after extraction mean the local parse is unsure
+DATE_HINT_RE = re.compile(
+    r'\b(?:today|tonight|tomorrow|monday|tuesday|wednesday|thursday|friday|saturday|sunday|'
+    r'next week|this week|eod|end of day|by \w+)\b',
+    re.IGNORECASE
+)
+
+# Due date / priority extraction - precompiled, no model round trip
+WEEKDAYS = {'mon': 0, 'tue': 1, 'wed': 2, 'thu': 3, 'fri': 4, 'sat': 5, 'sun': 6}
+# No bare "sat"/"sun" - too easy to hit "sun damage"
+_WEEKDAY_RE = (r'(?:mon(?:day)?|tue(?:s(?:day)?)?|wed(?:nesday)?|thu(?:r(?:s(?:day)?)?)?|'
+               r'fri(?:day)?|saturday|sunday)')
+# Sizes, pitches and materials after "3/4" / "1/2" mean a fraction, not a date
+FRACTION_UNITS_RE = (r'(?:inch(?:es)?|in|ft|foot|feet|mm|cm|"|\'\'|pipes?|valves?|pitch|ply|plywood|'
+                     r'drywall|sheets?|bolts?|screws?|nuts?|fittings?|copper|pvc|conduit|rebar|'
+                     r'thread|npt|hp|yards?|yds?|lbs?|gal(?:lons?)?|turns?|x)')
+DUE_DATE_RE = re.compile(
+    r'\b(?:(?P<lead>due|by|on|before|for)\s+)?(?:'
+    r'(?P<today>today|tonight|eod|end of (?:the )?day|cob|close of business)|'
+    r'(?P<tomorrow>tomorrow|tmrw|tmr)|'
+    r'(?P<next_week>next week)|'
+    r'(?P<this_week>this week|end of (?:the )?week|eow)|'
+    r'(?P<end_month>end of (?:the )?month|eom)|'
+    r'in (?P<in_n>\d{1,2}|a|one|two|three) (?P<in_unit>days?|weeks?)|'
+    r'(?P<wd_mod>this |next )?(?P<weekday>' + _WEEKDAY_RE + r')|'
+    r'(?P<month>1[0-2]|0?[1-9])/(?P<day>3[01]|[12]\d|0?[1-9])(?:/(?P<year>\d{2}|\d{4}))?'
+    r'(?![/\d])(?!\s*-?\s*' + FRACTION_UNITS_RE + r'(?![a-z]))'
+    r')(?![a-z0-9])',
+    re.IGNORECASE
+)
+PRIORITY_RE = re.compile(
+    r'\b(?:(?P<urgent>asap|a\.s\.a\.p|urgent(?:ly)?|immediately|right away|right now|critical|'
+    r'emergency|top priority)|'
+    r'(?P<high>high priority|important)|'
+    r'(?P<low>low priority|whenever|no rush|when you can))\b',
+    re.IGNORECASE
+)
+_NUMBER_WORDS = {'a': 1, 'one': 1, 'two': 2, 'three': 3}
+
+def _resolve_due_date(match, today):
+    """Turn one DUE_DATE_RE match into a date"""
+    if match.group('today'):
+        return today
+    if match.group('tomorrow'):
+        return today + timedelta(days=1)
+    if match.group('next_week'):
+        return today + timedelta(days=7 - today.weekday())
+    if match.group('this_week'):
+        return today + timedelta(days=max(0, 4 - today.weekday()))
+    if match.group('end_month'):
+        first_of_next = (today.replace(day=1) + timedelta(days=32)).replace(day=1)
+        return first_of_next - timedelta(days=1)
+    if match.group('in_n'):
+        n = match.group('in_n').lower()
+        n = _NUMBER_WORDS[n] if n in _NUMBER_WORDS else int(n)
+        return today + timedelta(days=n * 7 if match.group('in_unit').lower().startswith('week') else n)
+    if match.group('weekday'):
+        target = WEEKDAYS[match.group('weekday').lower()[:3]]
+        if (match.group('wd_mod') or '').strip().lower() == 'next':
+            # "next friday" = friday of next week
+            return today + timedelta(days=7 - today.weekday() + target)
+        return today + timedelta(days=(target - today.weekday()) % 7)
+    if match.group('month'):
+        # Bare "3/4" is usually a fraction - only "due/by/on/before 3/4" or a full date count
+        year = match.group('year')
+        if not year and (match.group('lead') or '').lower() not in ('due', 'by', 'on', 'before'):
+            return None
+        month, day = int(match.group('month')), int(match.group('day'))
+        try:
+            if year:
+                year = int(year) + (2000 if len(year) == 2 else 0)
+                return today.replace(year=year, month=month, day=day)
+            due = today.replace(month=month, day=day)
+            # A date well in the past means next year
+            return due if due >= today - timedelta(days=30) else due.replace(year=today.year + 1)
+        except ValueError:
+            return None
+    return None
+
+def extract_due_and_priority(text, today=None):
+    """Find due date and priority phrases
+
+    Returns {'due_date': 'YYYY-MM-DD' or None, 'priority': 1-4 or None,
+    'spans': [(start, end), ...]} so callers can strip the phrases. Only
+    phrases that resolved to a date are in spans.
+    """
+    today = today or datetime.now().date()
+    result = {'due_date': None, 'priority': None, 'spans': []}
+    
+    for match in DUE_DATE_RE.finditer(text):
+        due = _resolve_due_date(match, today)
+        if due:
+            if not result['due_date']:
+                result['due_date'] = due.strftime('%Y-%m-%d')
+            result['spans'].append(match.span())
+    
+    for match in PRIORITY_RE.finditer(text):
+        priority = 1 if match.group('urgent') else 2 if match.group('high') else 4
+        if result['priority'] is None or priority < result['priority']:
+            result['priority'] = priority
+        result['spans'].append(match.span())
+    
+    result['spans'].sort()
+    return result
+
+def strip_spans(text, spans):
+    """Remove the given (start, end) spans from text"""
+    for start, end in sorted(spans, reverse=True):
+        text = text[:start] + ' ' + text[end:]
+    return text
+
+PARSER_METRICS = {'local': 0, 'llm': 0, 'fallback': 0, 'local_ms': 0.0,
+                  'llm_calls': 0, 'llm_ms': 0.0}
+_parser_metrics_lock = threading.Lock()
+
+def record_parser_metric(tier, elapsed_ms=0.0):
+    with _parser_metrics_lock:
+        if tier == 'llm_call':
+            PARSER_METRICS['llm_calls'] += 1
+            PARSER_METRICS['llm_ms'] += elapsed_ms
+        else:
+            PARSER_METRICS[tier] += 1
+            if tier == 'local':
+                PARSER_METRICS['local_ms'] += elapsed_ms
+
+def parser_stats():
+    """Share of traffic per tier and model latency avoided by the local tier"""
+    with _parser_metrics_lock:
+        m = dict(PARSER_METRICS)
+    total = m['local'] + m['llm'] + m['fallback']
+    avg_llm_ms = m['llm_ms'] / m['llm_calls'] if m['llm_calls'] else None
+    return {
+        'threshold': PARSER_CONFIDENCE_THRESHOLD,
+        'messages': total,
+        'local': m['local'],
+        'llm': m['llm'],
+        'fallback': m['fallback'],
+        'local_fraction': round(m['local'] / total, 3) if total else None,
+        'llm_fraction': round(m['llm'] / total, 3) if total else None,
+        'avg_local_ms': round(m['local_ms'] / m['local'], 3) if m['local'] else None,
+        'avg_llm_ms': round(avg_llm_ms, 1) if avg_llm_ms else None,
+        'latency_saved_ms': round(m['local'] * avg_llm_ms) if avg_llm_ms else None,
+        'prompt_tokens': {
+            'requests': PROMPT_METRICS['requests'],
+            'avg_prompt': round(PROMPT_METRICS['prompt_tokens'] / PROMPT_METRICS['requests'], 1)
+                          if PROMPT_METRICS['requests'] else None,
+            'avg_completion': round(PROMPT_METRICS['completion_tokens'] / PROMPT_METRICS['requests'], 1)
+                              if PROMPT_METRICS['requests'] else None,
+            'last_prompt': PROMPT_METRICS['last_prompt_tokens']
+        }
+    }
+
+def parse_locally(message):
+    """Rule-based parse with the same fields as parse_with_openai plus a confidence"""
+    lower = message.lower()
+    if PROJECT_CREATION_RE.search(lower):
+        # Project creation has its own parsers
+        return {'type': 'create_project', 'confidence': 1.0}
+    if lower.strip(' .!?') in COMMAND_WORDS:
+        return None
+    
+    projects = SETTINGS.get('projects', {})
+    members = SETTINGS.get('team_members', {})
+    hits = get_keyword_matcher().scan(message)
+    # Settings may have been swapped since the matcher was built
+    hits['project'] = [hit for hit in hits['project'] if hit[0] in projects]
+    hits['member'] = [hit for hit in hits['member'] if hit[0] in members]
+    confidence = 0.55
+    
+    # Project - a "key:" prefix is the strongest signal
+    project_key = None
+    text = message
+    for key, start, end in hits['project']:
+        if is_project_prefix(lower, start, end):
+            project_key = key
+            text = message[:start] + message[end:].lstrip(' :-')
+            confidence += 0.2
+            break
+    if not project_key and hits['project']:
+        key, start, end = hits['project'][0]
+        project_key = key
+        # Drop "at oak street site" style mentions from the name
+        mention = re.compile(r'(?:\b(?:at|on|for|in)\s+(?:the\s+)?)?' + re.escape(message[start:end]) +
+                             r'(?:\s+(?:site|job|project))?\b', re.IGNORECASE)
+        text = mention.sub(' ', text, count=1)
+        confidence += 0.1
+    if len(hits['project']) > 1:
+        confidence -= 0.15
+    
+    # Assignee - remove the name and its connector ("mike needs to ...")
+    assignee = None
+    if hits['member']:
+        key = hits['member'][0][0]
+        assignee = members[key].get('name') or key
+        confidence += 0.1 if len(hits['member']) == 1 else -0.15
+        for term in sorted({key, assignee.lower()}, key=len, reverse=True):
+            text = re.sub(r'(?:\b(?:for|tell|ask|have|get)\s+)?\b' + re.escape(term) + r'\b' +
+                          MEMBER_CONNECTOR_RE, ' ', text, count=1, flags=re.IGNORECASE)
+    
+    # Due date and priority
+    extracted = extract_due_and_priority(text)
+    text = strip_spans(text, extracted['spans'])
+    priority = extracted['priority'] or 3
+    
+    # Clean up the task name
+    name = TASK_LEAD_IN_RE.sub('', text.strip())
+    name = re.sub(r'\s+', ' ', name).strip(' ,:;-.!')
+    if not name:
+        return None
+    name = name[0].upper() + name[1:]
+    
+    words = len(name.split())
+    if 2 <= words <= 8:
+        confidence += 0.15
+    elif words > 12:
+        confidence -= 0.25
+    if '?' in message:
+        confidence -= 0.2
+    if DATE_HINT_RE.search(name):
+        # A date phrase we couldn't resolve
+        confidence -= 0.25
+    
+    return {
+        'type': 'create_task',
+        'name': name,
+        'assignee': assignee,
+        'project': project_key if project_key in projects else None,
+        'priority': priority,
+        'due_date': extracted['due_date'],
+        'confidence': round(max(0.0, min(1.0, confidence)), 2)
+    }
+
+def parse_task_tiered(message):
+    """Local parser first; OpenAI only for long messages it isn't confident about
+
+    Returns None when neither tier is confident, so callers fall back to
+    their pattern parsers.
+    """
+    started = time.perf_counter()
+    local = parse_locally(message)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    
+    if local and local['type'] != 'create_task':
+        return local
+    
+    if local and local['confidence'] >= PARSER_CONFIDENCE_THRESHOLD:
+        record_parser_metric('local', elapsed_ms)
+        print(f"⚡ Local parse ({local['confidence']}): {local}")
+        return local
+    
+    if OPENAI_API_KEY and len(message) > 15:
+        ai_result = parse_with_openai(message)
+        if ai_result:
+            record_parser_metric('llm')
+            # Local date math beats the model's when we found a phrase
+            if local and local.get('due_date'):
+                ai_result['due_date'] = local['due_date']
+            if local and local['priority'] != 3:
+                ai_result['priority'] = local['priority']
+            return ai_result
+    
+    # No model available (or it failed) - let the caller's pattern parser handle it
+    record_parser_metric('fallback')
+    return None
+
+class MediaTooLarge(Exception):
+    """Raised when a Twilio media file exceeds MEDIA_MAX_BYTES"""
+
+def download_twilio_media(media_url, timeout=10):
+    """Stream a Twilio media file into a bounded spool file
+
+    Returns (file, size, content_type, sha256) with the file rewound. At
+    most MEDIA_SPOOL_MAX_MEMORY bytes are held in memory; the rest is on disk.
+    """
+    response = requests.get(
+        media_url,
+        auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN),
+        timeout=timeout,
+        stream=True
+    )
+    try:
+        if response.status_code != 200:
+            raise RuntimeError(f'download failed: {response.status_code}')
+        
+        spool = tempfile.SpooledTemporaryFile(max_size=MEDIA_SPOOL_MAX_MEMORY)
+        digest = hashlib.sha256()
+        size = 0
+        for chunk in response.iter_content(chunk_size=MEDIA_CHUNK_SIZE):
+            size += len(chunk)
+            if size > MEDIA_MAX_BYTES:
+                spool.close()
+                raise MediaTooLarge(f'media larger than {MEDIA_MAX_BYTES} bytes')
+            spool.write(chunk)
+            digest.update(chunk)
+        spool.seek(0)
+        return spool, size, response.headers.get('Content-Type', ''), digest.hexdigest()
+    finally:
+        response.close()
+
+TWILIO_MEDIA_SID_RE = re.compile(r'/Media/(ME[0-9a-fA-F]{32})')
+
+def media_sid_from_url(media_url):
+    """Twilio MediaSid from a media URL, or None"""
+    match = TWILIO_MEDIA_SID_RE.search(media_url or '')
+    return match.group(1) if match else None
+
+def file_sha256(fileobj):
+    """SHA-256 of a seekable file, leaving it rewound"""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(MEDIA_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+class MediaStore:
+    """Content-addressed (SHA-256) media files on disk with LRU eviction
+
+    The SQLite index maps Twilio MediaSids to content hashes, so a retried
+    webhook doesn't download again, and remembers where each hash was
+    uploaded, so a re-forwarded photo is linked rather than uploaded twice.
+    """
+
+    def __init__(self, directory, db_path, max_bytes):
+        self.directory = directory
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.counters = {'downloads': 0, 'downloads_skipped': 0, 'download_bytes_saved': 0,
+                         'duplicate_content': 0, 'uploads': 0, 'uploads_linked': 0,
+                         'uploads_skipped': 0, 'upload_bytes_saved': 0, 'evictions': 0}
+
+    def _conn(self):
+        conn = thread_connection(self._local)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS media_blobs (sha256 TEXT PRIMARY KEY, '
+                         'size INTEGER, content_type TEXT, last_used REAL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS media_sids (media_sid TEXT PRIMARY KEY, sha256 TEXT)')
+            conn.execute('CREATE TABLE IF NOT EXISTS media_uploads (sha256 TEXT, task_id TEXT, '
+                         'url TEXT, created REAL, PRIMARY KEY (sha256, task_id))')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def _path(self, sha256):
+        return os.path.join(self.directory, sha256[:2], sha256)
+
+    def _open_cached(self, media_sid):
+        """(file, size, content_type, sha256) for a MediaSid seen before, or None"""
+        row = self._conn().execute(
+            'SELECT b.sha256, b.size, b.content_type FROM media_sids s '
+            'JOIN media_blobs b ON b.sha256 = s.sha256 WHERE s.media_sid = ?', (media_sid,)
+        ).fetchone()
+        if not row:
+            return None
+        try:
+            fileobj = open(self._path(row[0]), 'rb')
+        except FileNotFoundError:
+            return None
+        self._conn().execute('UPDATE media_blobs SET last_used = ? WHERE sha256 = ?', (time.time(), row[0]))
+        return fileobj, row[1], row[2], row[0]
+
+    def _put(self, fileobj, size, content_type, sha256):
+        """Copy a downloaded file into the store (no-op if the content is already there)"""
+        path = self._path(sha256)
+        if os.path.exists(path):
+            self.count('duplicate_content')
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in iter(lambda: fileobj.read(MEDIA_CHUNK_SIZE), b''):
+                    out.write(chunk)
+            os.replace(tmp_path, path)
+            fileobj.seek(0)
+        self._conn().execute(
+            'INSERT OR REPLACE INTO media_blobs (sha256, size, content_type, last_used) VALUES (?, ?, ?, ?)',
+            (sha256, size, content_type, time.time())
+        )
+        self._evict()
+
+    def _evict(self):
+        """Drop least recently used files until the store fits in max_bytes"""
+        conn = self._conn()
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM media_blobs').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for sha256, size in conn.execute('SELECT sha256, size FROM media_blobs ORDER BY last_used').fetchall():
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._path(sha256))
+            except FileNotFoundError:
+                pass
+            conn.execute('DELETE FROM media_blobs WHERE sha256 = ?', (sha256,))
+            total -= size
+            self.count('evictions')
+
+    def fetch(self, media_url, timeout=10):
+        """Like download_twilio_media, but served from disk for a known MediaSid"""
+        media_sid = media_sid_from_url(media_url)
+        if media_sid:
+            try:
+                cached = self._open_cached(media_sid)
+            except Exception as e:
+                print(f"Media cache read error: {e}")
+                cached = None
+            if cached:
+                self.count('downloads_skipped')
+                self.count('download_bytes_saved', cached[1])
+                return cached
+        
+        fileobj, size, content_type, sha256 = download_twilio_media(media_url, timeout=timeout)
+        self.count('downloads')
+        try:
+            self._put(fileobj, size, content_type, sha256)
+            if media_sid:
+                self._conn().execute('INSERT OR REPLACE INTO media_sids (media_sid, sha256) VALUES (?, ?)',
+                                     (media_sid, sha256))
+        except Exception as e:
+            # The store is an optimisation - never fail the download over it
+            print(f"Media cache write error: {e}")
+            fileobj.seek(0)
+        return fileobj, size, content_type, sha256
+
+    def find_upload(self, sha256, task_id):
+        """(task_id, url) of an earlier upload of this content, preferring this task, then one with a URL"""
+        return self._conn().execute(
+            'SELECT task_id, url FROM media_uploads WHERE sha256 = ? '
+            'ORDER BY task_id = ? DESC, url != \'\' DESC, created DESC LIMIT 1',
+            (sha256, task_id)
+        ).fetchone()
+
+    def record_upload(self, sha256, task_id, url):
+        self.count('uploads')
+        try:
+            self._conn().execute(
+                'INSERT OR REPLACE INTO media_uploads (sha256, task_id, url, created) VALUES (?, ?, ?, ?)',
+                (sha256, task_id, url, time.time())
+            )
+        except Exception as e:
+            print(f"Media cache write error: {e}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        try:
+            count, total = self._conn().execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM media_blobs'
+            ).fetchone()
+            stats.update({'files': count, 'bytes': total, 'max_bytes': self.max_bytes})
+        except Exception as e:
+            stats['error'] = str(e)
+        return stats
+
+media_store = MediaStore(MEDIA_CACHE_DIR, MEDIA_CACHE_DB, MEDIA_CACHE_MAX_BYTES)
+
+def handle_mms_image(media_url, message_text, from_number):
+    """Process MMS images and create tasks with attachments"""
+    try:
+        print(f"📸 Downloading image from: {media_url}")
+        
+        # Stream the image from Twilio into a spool file (or reuse the stored copy)
+        image_file, image_size, content_type, sha256 = media_store.fetch(media_url, timeout=10)
+        print(f"✅ Image ready: {image_size} bytes")
+        
+        # Create task with description mentioning the photo
+        task_description = f"📷 Photo attached\n{message_text}\nFrom: {from_number}"
+        
+        return {
+            'has_image': True,
+            'image_data': image_file,
+            'image_size': image_size,
+            'content_type': content_type,
+            'sha256': sha256,
+            'description': task_description,
+            'media_url': media_url  # Keep URL as backup
+        }
             
     except Exception as e:
         print(f"Error processing MMS: {e}")
     
     return {'has_image': False}
 
+def collect_media(form):
+    """Every MediaUrlN / MediaContentTypeN pair in a Twilio webhook"""
+    try:
+        count = int(form.get('NumMedia', '0') or 0)
+    except ValueError:
+        count = 0
+    return [
+        {'url': form.get(f'MediaUrl{i}', ''), 'content_type': form.get(f'MediaContentType{i}', '')}
+        for i in range(count) if form.get(f'MediaUrl{i}')
+    ]
+
+def download_mms_images(media, message_text, from_number):
+    """Download image media concurrently; returns the successful results in order"""
+    if not media:
+        return []
+    with ThreadPoolExecutor(max_workers=min(MEDIA_CONCURRENCY, len(media))) as pool:
+        results = list(pool.map(
+            lambda item: handle_mms_image(item['url'], message_text, from_number), media
+        ))
+    return [result for result in results if result['has_image']]
+
+# Voice transcription
+AUDIO_EXTENSIONS = {
+    'audio/mpeg': 'mp3', 'audio/mp3': 'mp3', 'audio/mp4': 'm4a', 'audio/x-m4a': 'm4a',
+    'audio/aac': 'm4a', 'audio/ogg': 'ogg', 'audio/wav': 'wav', 'audio/x-wav': 'wav',
+    'audio/webm': 'webm', 'audio/amr': 'amr'
+}
+
+# Audio hash -> transcript (persisted next to parse results when PARSE_CACHE_DB is set)
+transcript_cache = TTLCache('transcript', maxsize=500, ttl=TRANSCRIPT_CACHE_TTL,
+                            db_path=PARSE_CACHE_DB or None)
+
+class OpenAITranscriber:
+    """Remote Whisper API"""
+
+    name = 'openai'
+
+    def available(self):
+        return bool(OPENAI_API_KEY)
+
+    def warm(self, wait=False):
+        pass
+
+    def transcribe(self, audio_data, filename):
+        """(text, audio seconds or None) from an in-memory buffer; the SDK takes the upload name from .name"""
+        buffer = BytesIO(audio_data)
+        buffer.name = filename
+        transcript = get_openai().Audio.transcribe("whisper-1", buffer, response_format='verbose_json')
+        
+        # Get text from response
+        if isinstance(transcript, dict):
+            return transcript.get('text', ''), transcript.get('duration')
+        return str(transcript), None
+
+# Loaded once in each local transcription process by the pool initializer
+_local_stt_model = None
+
+def _local_stt_init(model_name, compute_type, cpu_threads):
+    global _local_stt_model
+    from faster_whisper import WhisperModel
+    _local_stt_model = WhisperModel(model_name, device='cpu', compute_type=compute_type,
+                                    cpu_threads=cpu_threads)
+
+def _local_stt_ping():
+    return _local_stt_model is not None
+
+def _local_stt_transcribe(audio_data):
+    segments, info = _local_stt_model.transcribe(BytesIO(audio_data), beam_size=1, vad_filter=True)
+    text = ' '.join(segment.text.strip() for segment in segments)
+    return text, info.duration
+
+class LocalTranscriber:
+    """Offline faster-whisper on CPU in a warm process pool"""
+
+    name = 'local'
+
+    def __init__(self, model_name, compute_type, processes, cpu_threads):
+        self.model_name = model_name
+        self.compute_type = compute_type
+        self.processes = processes
+        self.cpu_threads = cpu_threads
+        self._available = None
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def available(self):
+        if self._available is None:
+            try:
+                import importlib.util
+                self._available = importlib.util.find_spec('faster_whisper') is not None
+            except Exception:
+                self._available = False
+        return self._available
+
+    def _get_pool(self):
+        pid = os.getpid()
+        with self._lock:
+            if self._pid != pid:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context(PROCESS_START_METHOD),
+                    initializer=_local_stt_init,
+                    initargs=(self.model_name, self.compute_type, self.cpu_threads)
+                )
+                self._pid = pid
+            return self._pool
+
+    def _discard_pool(self, pool):
+        """Drop a broken pool so the next call starts fresh processes"""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+                self._pid = None
+        pool.shutdown(wait=False)
+        _count_transcription('pool_restarts')
+        print("⚠️  Local STT worker died - restarting the process pool")
+
+    def warm(self, wait=False):
+        """Start the processes and load the model so the first voice note doesn't pay for it"""
+        pool = self._get_pool()
+        try:
+            futures = [pool.submit(_local_stt_ping) for _ in range(self.processes)]
+            if wait:
+                for future in futures:
+                    future.result()
+        except BrokenProcessPool:
+            self._discard_pool(pool)
+            raise
+
+    def transcribe(self, audio_data, filename):
+        pool = self._get_pool()
+        try:
+            return pool.submit(_local_stt_transcribe, audio_data).result()
+        except BrokenProcessPool:
+            # A worker was killed (OOM, segfault); this clip falls back to the API
+            self._discard_pool(pool)
+            raise
+
+TRANSCRIBERS = {
+    'openai': OpenAITranscriber(),
+    'local': LocalTranscriber(LOCAL_STT_MODEL, LOCAL_STT_COMPUTE_TYPE, LOCAL_STT_PROCESSES, LOCAL_STT_THREADS)
+}
+
+def active_transcribers():
+    """Configured backends that can run here, in preference order"""
+    return [TRANSCRIBERS[name] for name in STT_BACKENDS
+            if name in TRANSCRIBERS and TRANSCRIBERS[name].available()]
+
+def warm_transcribers():
+    for backend in active_transcribers():
+        try:
+            backend.warm()
+        except Exception as e:
+            print(f"Could not warm {backend.name} transcriber: {e}")
+
+TRANSCRIBE_METRICS = {'transcribed': 0, 'failed': 0, 'rejected': 0, 'timeouts': 0, 'fallbacks': 0,
+                      'pool_restarts': 0}
+_transcribe_latencies = {}  # backend -> deque of (ms, real-time factor or None)
+_transcribe_lock = threading.Lock()
+_transcribe_pool = {'pid': None, 'pool': None, 'slots': None}
+
+def get_transcribe_pool():
+    """(executor, slots) for this process; slots bound running + queued jobs"""
+    pid = os.getpid()
+    with _transcribe_lock:
+        if _transcribe_pool['pid'] != pid:
+            _transcribe_pool['pool'] = ThreadPoolExecutor(max_workers=TRANSCRIBE_WORKERS,
+                                                          thread_name_prefix='transcribe')
+            _transcribe_pool['slots'] = threading.BoundedSemaphore(TRANSCRIBE_WORKERS + TRANSCRIBE_QUEUE_SIZE)
+            _transcribe_pool['pid'] = pid
+        return _transcribe_pool['pool'], _transcribe_pool['slots']
+
+def _count_transcription(name):
+    with _transcribe_lock:
+        TRANSCRIBE_METRICS[name] += 1
+
+def run_transcriber(backend, audio_data, filename):
+    """Transcribe with one backend; returns (text, ms, real-time factor)"""
+    started = time.perf_counter()
+    text, duration = backend.transcribe(audio_data, filename)
+    elapsed = time.perf_counter() - started
+    rtf = elapsed / duration if duration else None
+    with _transcribe_lock:
+        _transcribe_latencies.setdefault(backend.name, deque(maxlen=500)).append((elapsed * 1000, rtf))
+    return text, elapsed * 1000, rtf
+
+def _transcribe_with_fallback(audio_data, filename):
+    """First backend that succeeds wins"""
+    backends = active_transcribers()
+    if not backends:
+        raise RuntimeError('no transcription backend available')
+    for n, backend in enumerate(backends):
+        try:
+            return run_transcriber(backend, audio_data, filename)[0]
+        except Exception as e:
+            if n == len(backends) - 1:
+                raise
+            print(f"{backend.name} transcription failed ({e}), trying {backends[n + 1].name}")
+            _count_transcription('fallbacks')
+
+def transcribe_audio(audio_data, filename, audio_hash):
+    """Transcript for an audio clip, or None if it failed, timed out or the queue is full"""
+    def compute():
+        pool, slots = get_transcribe_pool()
+        if not slots.acquire(blocking=False):
+            print("Transcription queue full - skipping voice note")
+            _count_transcription('rejected')
+            return None
+        try:
+            future = pool.submit(_transcribe_with_fallback, audio_data, filename)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda f: slots.release())
+        
+        try:
+            text = future.result(timeout=TRANSCRIBE_TIMEOUT)
+        except FuturesTimeout:
+            # The call keeps its slot until it finishes, so a hung backend still backs up the queue
+            print(f"Transcription timed out after {TRANSCRIBE_TIMEOUT}s")
+            _count_transcription('timeouts')
+            return None
+        except Exception as e:
+            print(f"Transcription error: {e}")
+            _count_transcription('failed')
+            return None
+        _count_transcription('transcribed')
+        return text
+    
+    return transcript_cache.get_or_compute(audio_hash, compute, wait_timeout=TRANSCRIBE_TIMEOUT)
+
+def transcription_stats():
+    with _transcribe_lock:
+        stats = dict(TRANSCRIBE_METRICS)
+        samples = {name: list(values) for name, values in _transcribe_latencies.items()}
+    
+    def pct(values, p):
+        if not values:
+            return None
+        return round(values[min(len(values) - 1, int(len(values) * p))])
+    
+    backends = {}
+    for name, values in samples.items():
+        latencies = sorted(ms for ms, _ in values)
+        rtfs = [rtf for _, rtf in values if rtf is not None]
+        backends[name] = {
+            'latency_ms': {'p50': pct(latencies, 0.5), 'p95': pct(latencies, 0.95),
+                           'p99': pct(latencies, 0.99), 'max': pct(latencies, 1.0),
+                           'samples': len(latencies)},
+            'avg_rtf': round(sum(rtfs) / len(rtfs), 3) if rtfs else None
+        }
+    
+    stats.update({
+        'workers': TRANSCRIBE_WORKERS,
+        'queue_size': TRANSCRIBE_QUEUE_SIZE,
+        'active_backends': [backend.name for backend in active_transcribers()],
+        'backends': backends,
+        'cache': transcript_cache.stats()
+    })
+    return stats
+
 # Simple voice handler
 def handle_audio_mms_simple(media_url, from_number):
     """Simplified audio handler with timeout protection"""
     try:
         print(f"🎤 Processing audio from: {media_url}")
         
-        # Download audio from Twilio (with shorter timeout)
-        response = requests.get(
-            media_url,
-            auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN),
-            timeout=5  # Short timeout
-        )
+        # Only transcribe if a backend is configured
+        if not active_transcribers():
+            print("No transcription backend configured for voice")
+            return None
         
-        if response.status_code == 200:
-            audio_data = response.content
-            print(f"✅ Audio downloaded: {len(audio_data)} bytes")
-            
-            # Only transcribe if we have OpenAI configured
-            if OPENAI_API_KEY:
-                try:
-                    # Save to temp file
-                    with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as tmp_file:
-                        tmp_file.write(audio_data)
-                        tmp_file_path = tmp_file.name
-                    
-                    # Transcribe with Whisper (v0.28 syntax)
-                    with open(tmp_file_path, 'rb') as audio_file:
-                        transcript = openai.Audio.transcribe(
-                            "whisper-1",
-                            audio_file
-                        )
-                    
-                    # Clean up temp file
-                    os.remove(tmp_file_path)
-                    
-                    # Get text from response
-                    if isinstance(transcript, dict):
-                        text = transcript.get('text', '')
-                    else:
-                        text = str(transcript)
-                    
-                    print(f"📝 Transcribed: {text[:100]}")
-                    return text
-                    
-                except Exception as e:
-                    print(f"Transcription error: {e}")
-                    return None
-            else:
-                print("OpenAI not configured for voice")
-                return None
-        else:
-            print(f"Failed to download audio: {response.status_code}")
+        # Download audio from Twilio
+        audio_file, audio_size, content_type, audio_hash = media_store.fetch(media_url, timeout=AUDIO_DOWNLOAD_TIMEOUT)
+        with audio_file:
+            audio_data = audio_file.read()
+        print(f"✅ Audio downloaded: {audio_size} bytes")
+        
+        extension = AUDIO_EXTENSIONS.get(content_type.split(';')[0].strip().lower(), 'mp3')
+        text = transcribe_audio(audio_data, f'voice.{extension}', audio_hash)
+        if text is None:
             return None
+        
+        print(f"📝 Transcribed: {text[:100]}")
+        return text
             
     except Exception as e:
         print(f"Audio error: {e}")
         return None
 
-def create_clickup_task_with_attachment(task_info, image_data=None):
-    """Enhanced task creation that properly handles attachments"""
-    headers = {
-        'Authorization': CLICKUP_KEY,
-        'Content-Type': 'application/json'
+# Default list for tasks that don't name a project
+DEFAULT_LIST_TTL = int(os.getenv('DEFAULT_LIST_TTL', '600'))
+_default_list_cache = {'list_id': None, 'expires': 0}
+_default_list_lock = threading.Lock()
+
+def get_default_list_id():
+    """Resolve the list used when a task has no project (settings override, then cache)"""
+    override = SETTINGS.get('default_list_id')
+    if override:
+        return {'success': True, 'list_id': override}
+    
+    with _default_list_lock:
+        if _default_list_cache['list_id'] and time.time() < _default_list_cache['expires']:
+            return {'success': True, 'list_id': _default_list_cache['list_id']}
+    
+    data = cached_clickup_get(f'/team/{WORKSPACE_ID}/list', timeout=10)
+    if data is None:
+        return {'success': False, 'error': 'Could not find lists'}
+    
+    lists = data.get('lists', [])
+    if not lists:
+        return {'success': False, 'error': 'No lists found. Create a project first.'}
+    
+    with _default_list_lock:
+        _default_list_cache['list_id'] = lists[0]['id']
+        _default_list_cache['expires'] = time.time() + DEFAULT_LIST_TTL
+    
+    return {'success': True, 'list_id': lists[0]['id']}
+
+def invalidate_default_list():
+    """Forget the cached default list (projects were created or synced)"""
+    with _default_list_lock:
+        _default_list_cache['list_id'] = None
+        _default_list_cache['expires'] = 0
+
+# Image format detection and optional downscaling
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'jpg', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png', 'image/png'),
+    (b'GIF87a', 'gif', 'image/gif'),
+    (b'GIF89a', 'gif', 'image/gif'),
+]
+
+def detect_image_format(header):
+    """(extension, content type) from the first bytes of a file"""
+    for signature, ext, content_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return ext, content_type
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp', 'image/webp'
+    if header[4:8] == b'ftyp' and header[8:12] in (b'heic', b'heix', b'mif1', b'msf1'):
+        return 'heic', 'image/heic'
+    return 'jpg', 'image/jpeg'
+
+EXIF_DATETIME = 0x0132
+EXIF_IFD = 0x8769
+EXIF_DATETIME_ORIGINAL = 0x9003
+EXIF_GPS_IFD = 0x8825
+
+def _downscale_image(data, max_dimension, quality):
+    """Resize and re-encode one image (runs in the image process pool)
+
+    Only GPS and timestamp EXIF tags survive. Returns (bytes, ext,
+    content type) or None if the result wouldn't be smaller.
+    """
+    from PIL import Image, ImageOps
+    
+    image = Image.open(BytesIO(data))
+    exif = image.getexif()
+    kept = Image.Exif()
+    if EXIF_DATETIME in exif:
+        kept[EXIF_DATETIME] = exif[EXIF_DATETIME]
+    original_time = exif.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL)
+    if original_time:
+        kept[EXIF_IFD] = {EXIF_DATETIME_ORIGINAL: original_time}
+    gps = exif.get_ifd(EXIF_GPS_IFD)
+    if gps:
+        kept[EXIF_GPS_IFD] = gps
+    
+    # Bake in the orientation before the tag is dropped
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_dimension, max_dimension))
+    
+    out = BytesIO()
+    has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+    if has_alpha:
+        image.save(out, 'PNG', optimize=True)
+        ext, content_type = 'png', 'image/png'
+    else:
+        image.convert('RGB').save(out, 'JPEG', quality=quality, optimize=True, exif=kept.tobytes())
+        ext, content_type = 'jpg', 'image/jpeg'
+    
+    result = out.getvalue()
+    if len(result) >= len(data):
+        return None
+    return result, ext, content_type
+
+IMAGE_METRICS = {'processed': 0, 'skipped': 0, 'failed': 0, 'bytes_in': 0, 'bytes_out': 0,
+                 'processing_ms': 0.0, 'upload_bytes': 0, 'upload_s': 0.0}
+_image_metrics_lock = threading.Lock()
+_image_pool = {'pid': None, 'pool': None}
+_image_pool_lock = threading.Lock()
+
+def get_image_pool():
+    """Process pool for CPU-heavy encoding, created per worker process"""
+    pid = os.getpid()
+    with _image_pool_lock:
+        if _image_pool['pid'] != pid:
+            _image_pool['pool'] = ProcessPoolExecutor(
+                max_workers=IMAGE_WORKERS,
+                mp_context=multiprocessing.get_context(PROCESS_START_METHOD)
+            )
+            _image_pool['pid'] = pid
+        return _image_pool['pool']
+
+def optimize_attachment(attachment):
+    """Downscale a large photo in the process pool; returns the attachment to upload"""
+    if not IMAGE_PROCESSING or attachment['size'] < IMAGE_MIN_BYTES or \
+            attachment['content_type'] not in ('image/jpeg', 'image/png', 'image/webp'):
+        with _image_metrics_lock:
+            IMAGE_METRICS['skipped'] += 1
+        return attachment
+    
+    started = time.perf_counter()
+    try:
+        data = attachment['file'].read()
+        attachment['file'].seek(0)
+        result = get_image_pool().submit(_downscale_image, data, IMAGE_MAX_DIMENSION, IMAGE_QUALITY).result(timeout=30)
+    except Exception as e:
+        # Upload the original rather than lose the photo
+        print(f"Image processing error: {e}")
+        with _image_metrics_lock:
+            IMAGE_METRICS['failed'] += 1
+        return attachment
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    
+    if not result:
+        with _image_metrics_lock:
+            IMAGE_METRICS['skipped'] += 1
+        return attachment
+    
+    processed, ext, content_type = result
+    with _image_metrics_lock:
+        IMAGE_METRICS['processed'] += 1
+        IMAGE_METRICS['bytes_in'] += attachment['size']
+        IMAGE_METRICS['bytes_out'] += len(processed)
+        IMAGE_METRICS['processing_ms'] += elapsed_ms
+    print(f"🖼️  Downscaled {attachment['filename']}: {attachment['size']} -> {len(processed)} bytes in {elapsed_ms:.0f} ms")
+    
+    stem = attachment['filename'].rsplit('.', 1)[0]
+    return dict(attachment, file=BytesIO(processed), size=len(processed),
+                filename=f'{stem}.{ext}', content_type=content_type)
+
+def record_upload_throughput(size, seconds):
+    with _image_metrics_lock:
+        IMAGE_METRICS['upload_bytes'] += size
+        IMAGE_METRICS['upload_s'] += seconds
+
+def image_stats():
+    """Bytes saved by downscaling and the upload time that saves at measured throughput"""
+    with _image_metrics_lock:
+        m = dict(IMAGE_METRICS)
+    saved = m['bytes_in'] - m['bytes_out']
+    throughput = m['upload_bytes'] / m['upload_s'] if m['upload_s'] else None
+    upload_saved_ms = saved / throughput * 1000 if throughput else None
+    return {
+        'enabled': IMAGE_PROCESSING,
+        'processed': m['processed'],
+        'skipped': m['skipped'],
+        'failed': m['failed'],
+        'bytes_saved': saved,
+        'ratio': round(m['bytes_out'] / m['bytes_in'], 3) if m['bytes_in'] else None,
+        'processing_ms': round(m['processing_ms']),
+        'upload_throughput_bps': round(throughput) if throughput else None,
+        'time_saved_ms': round(upload_saved_ms - m['processing_ms']) if upload_saved_ms is not None else None
     }
+
+def normalize_attachments(image_data, task_info):
+    """Turn bytes, a file, or a list of handle_mms_image results into attachment dicts"""
+    items = image_data if isinstance(image_data, list) else [{
+        'image_data': image_data,
+        'media_url': task_info.get('media_url')
+    }]
+    
+    attachments = []
+    for n, item in enumerate(items, 1):
+        data = item['image_data']
+        if isinstance(data, bytes):
+            fileobj, size = BytesIO(data), len(data)
+        else:
+            fileobj = data
+            fileobj.seek(0, os.SEEK_END)
+            size = fileobj.tell()
+            fileobj.seek(0)
+        sha256 = item.get('sha256') or file_sha256(fileobj)
+        
+        # Label with the real format rather than assuming JPEG
+        ext, content_type = detect_image_format(fileobj.read(16))
+        fileobj.seek(0)
+        attachments.append({
+            'file': fileobj,
+            'size': size,
+            'filename': f'photo.{ext}' if len(items) == 1 else f'photo{n}.{ext}',
+            'content_type': content_type,
+            'sha256': sha256,
+            'media_url': item.get('media_url')
+        })
+    return attachments
+
+def upload_attachment(task_id, attachment):
+    """Upload one attachment; returns True on success
+
+    Content already uploaded elsewhere is linked instead: the earlier
+    attachment URL is stored in attachment['linked_url'] and True is
+    returned, but nothing is attached - callers count those as linked.
+    """
+    try:
+        previous = media_store.find_upload(attachment['sha256'], task_id)
+        # Another task's upload is only reusable if ClickUp gave us its URL
+        if previous and (previous[0] == task_id or previous[1]):
+            if previous[0] == task_id:
+                # Retry of a webhook we already handled - nothing to do
+                media_store.count('uploads_skipped')
+            else:
+                attachment['linked_url'] = previous[1]
+                media_store.count('uploads_linked')
+            media_store.count('upload_bytes_saved', attachment['size'])
+            print(f"♻️  {attachment['filename']} already uploaded ({previous[0]})")
+            return True
+    except Exception as e:
+        print(f"Media cache read error: {e}")
     
     try:
-    # Continue from line ~1425 in the create_clickup_task_with_attachment function
+        sha256 = attachment['sha256']
+        attachment = optimize_attachment(attachment)
+        
+        # ClickUp expects 'attachment' as the form field name;
+        # the body is streamed straight from the spool file
+        started = time.perf_counter()
+        attach_response = clickup.upload_stream(
+            f'/task/{task_id}/attachment',
+            attachment['file'],
+            attachment['size'],
+            attachment['filename'],
+            attachment['content_type'],
+            timeout=15
+        )
+        record_upload_throughput(attachment['size'], time.perf_counter() - started)
+        print(f"Attachment response ({attachment['filename']}): {attach_response.status_code}")
+        if attach_response.status_code != 200:
+            print(f"Attachment response body: {attach_response.text}")
+            return False
+        try:
+            url = attach_response.json().get('url', '')
+        except ValueError:
+            url = ''
+        media_store.record_upload(sha256, task_id, url)
+        return True
+    except Exception as e:
+        print(f"Attachment error: {e}")
+        return False
+
+def upload_attachments(task_id, attachments):
+    """Upload attachments concurrently (capped per request); results in input order"""
+    if len(attachments) == 1:
+        return [upload_attachment(task_id, attachments[0])]
+    
+    # Pool threads don't inherit the caller's rate-limit priority
+    priority = current_clickup_priority()
+    def upload(attachment):
+        with clickup_priority(priority):
+            return upload_attachment(task_id, attachment)
+    
+    with ThreadPoolExecutor(max_workers=min(MEDIA_CONCURRENCY, len(attachments))) as pool:
+        return list(pool.map(upload, attachments))
+
+def add_photo_links(task_id, description, failed_urls, linked_urls):
+    """Put photo links in the task description
+
+    Failed uploads fall back to their media URLs; photos uploaded to another
+    task before are linked the same way.
+    """
+    if not failed_urls and not linked_urls:
+        return
+    print("Adding photo links to description")
+    try:
+        update_data = {
+            'description': description + "\n\n" +
+                "\n".join([f"📸 Photo: {url}" for url in failed_urls] +
+                          [f"📎 Photo (already uploaded): {url}" for url in linked_urls])
+        }
+        clickup.put(
+            f'/task/{task_id}',
+            json=update_data,
+            timeout=10
+        )
+    except Exception as e:
+        print(f"Attachment fallback error: {e}")
+
+def create_clickup_task_with_attachment(task_info, image_data=None):
+    """Enhanced task creation that properly handles attachments
+
+    image_data may be raw bytes, a file, or a list of handle_mms_image
+    results (one task, every photo attached).
+    """
+    try:
         # First create the task
         list_id = task_info.get('list_id')
         
         if not list_id:
-            # Get first available list or use default
-            list_response = requests.get(
-                f'{BASE_URL}/team/{WORKSPACE_ID}/list',
-                headers=headers,
-                timeout=10
-            )
-            
-            if list_response.status_code != 200:
-                return {'success': False, 'error': 'Could not find lists'}
-            
-            lists = list_response.json().get('lists', [])
-            if not lists:
-                return {'success': False, 'error': 'No lists found'}
-            
-            list_id = lists[0]['id']
+            # Fall back to the cached default list
+            default = get_default_list_id()
+            if not default['success']:
+                return default
+            list_id = default['list_id']
         
         # Create task
         task_data = {
@@ -1419,9 +3681,8 @@ def create_clickup_task_with_attachment(task_info, image_data=None):
             task_data['due_date'] = int(due_date.timestamp() * 1000)
         
         print(f"Creating task: {task_data['name']}")
-        task_response = requests.post(
-            f'{BASE_URL}/list/{list_id}/task',
-            headers=headers,
+        task_response = clickup.post(
+            f'/list/{list_id}/task',
             json=task_data,
             timeout=10
         )
@@ -1429,59 +3690,32 @@ def create_clickup_task_with_attachment(task_info, image_data=None):
         if task_response.status_code == 200:
             task = task_response.json()
             task_id = task['id']
+            task_index.upsert(task)
+            invalidate_list_reads(list_id)
             print(f"✅ Task created: {task_id}")
             
-            # If we have an image, attach it
+            # If we have images, attach them (concurrently when there are several)
             if image_data:
-                try:
-                    print(f"📎 Attaching image to task {task_id}")
-                    
-                    # Create BytesIO object for the image
-                    image_file = BytesIO(image_data)
-                    image_file.name = 'photo.jpg'
-                    
-                    attachment_url = f'{BASE_URL}/task/{task_id}/attachment'
-                    
-                    # Important: Don't include Content-Type for multipart
-                    headers_attach = {'Authorization': CLICKUP_KEY}
-                    
-                    # ClickUp expects 'attachment' as the form field name
-                    files = {
-                        'attachment': ('photo.jpg', image_file, 'image/jpeg')
-                    }
-                    
-                    attach_response = requests.post(
-                        attachment_url,
-                        headers=headers_attach,
-                        files=files,
-                        timeout=15
-                    )
-                    
-                    print(f"Attachment response: {attach_response.status_code}")
-                    
-                    if attach_response.status_code != 200:
-                        print(f"Attachment response body: {attach_response.text}")
-                        
-                        # If attachment fails, add media URL to description as fallback
-                        if task_info.get('media_url'):
-                            print("Falling back to URL in description")
-                            update_data = {
-                                'description': task_data['description'] + f"\n\n📸 Photo: {task_info['media_url']}"
-                            }
-                            requests.put(
-                                f'{BASE_URL}/task/{task_id}',
-                                headers=headers,
-                                json=update_data,
-                                timeout=10
-                            )
-                    else:
-                        print("✅ Image attached successfully!")
-                        return {'success': True, 'task': task, 'attachment': True}
-                        
-                except Exception as e:
-                    print(f"Attachment error: {e}")
-                    # Task was created, just attachment failed
-                    return {'success': True, 'task': task, 'attachment': False}
+                attachments = normalize_attachments(image_data, task_info)
+                print(f"📎 Attaching {len(attachments)} image(s) to task {task_id}")
+                
+                results = upload_attachments(task_id, attachments)
+                failed_urls = [a['media_url'] for a, ok in zip(attachments, results)
+                               if not ok and a.get('media_url')]
+                linked_urls = [a['linked_url'] for a in attachments if a.get('linked_url')]
+                # A linked photo is only a link in the description, not an attachment
+                attached = sum(1 for ok in results if ok) - len(linked_urls)
+                
+                add_photo_links(task_id, task_data['description'], failed_urls, linked_urls)
+                
+                return {
+                    'success': True,
+                    'task': task,
+                    'attachment': attached > 0,
+                    'attached': attached,
+                    'linked': len(linked_urls),
+                    'attachment_total': len(attachments)
+                }
             
             return {'success': True, 'task': task}
         else:
@@ -1492,93 +3726,364 @@ def create_clickup_task_with_attachment(task_info, image_data=None):
         print(f"Error creating task with attachment: {e}")
         return {'success': False, 'error': str(e)}
 
-# Task management functions (rest of the functions remain the same)
-def get_clickup_tasks_for_project(project_key):
-    """Get all open tasks for a specific project"""
-    headers = {
-        'Authorization': CLICKUP_KEY,
-        'Content-Type': 'application/json'
-    }
-    
-    try:
-        # Get the list ID for this project
-        project = SETTINGS.get('projects', {}).get(project_key)
-        if not project:
-            return {'success': False, 'error': 'Project not found'}
-        
-        list_id = project['list_id']
-        
-        # Get tasks from this list
-        response = requests.get(
-            f'{BASE_URL}/list/{list_id}/task',
-            headers=headers,
-            params={
-                'archived': 'false',
-                'statuses[]': ['to do', 'in progress', 'open']  # Only open tasks
-            },
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            tasks = response.json().get('tasks', [])
-            return {'success': True, 'tasks': tasks}
-        else:
-            return {'success': False, 'error': 'Could not fetch tasks'}
-            
-    except Exception as e:
-        print(f"Error fetching tasks: {e}")
-        return {'success': False, 'error': str(e)}
+# Task management functions (rest of the functions remain the same)
+OPEN_STATUSES = ['to do', 'in progress', 'open']
+CLICKUP_PAGE_SIZE = 100  # fixed by the API
+
+def slim_task(task):
+    """The fields task listings use - keeps cached pages small"""
+    priority = task.get('priority') or {}
+    return {
+        'id': task['id'],
+        'name': task.get('name', ''),
+        'status': (task.get('status') or {}).get('status'),
+        'priority': int(priority['id']) if priority.get('id') else None,
+        'due_date': int(task['due_date']) if task.get('due_date') else None
+    }
+
+def slim_task_page(data):
+    tasks = data.get('tasks', [])
+    return {
+        'tasks': [slim_task(task) for task in tasks],
+        'last_page': bool(data.get('last_page')) or len(tasks) < CLICKUP_PAGE_SIZE
+    }
+
+def iter_list_tasks(list_id, statuses=None, order_by=None, reverse=False, timeout=10):
+    """Yield slim open tasks from a list a page at a time
+
+    Pages are only fetched as the caller consumes them, so taking the first
+    few tasks costs one request.
+    """
+    params = {
+        'archived': 'false',
+        'subtasks': 'false',
+        'statuses[]': statuses or OPEN_STATUSES
+    }
+    if order_by:
+        params['order_by'] = order_by
+        params['reverse'] = 'true' if reverse else 'false'
+    
+    page = 0
+    while True:
+        data = cached_clickup_get(f'/list/{list_id}/task', params=dict(params, page=page),
+                                  timeout=timeout, transform=slim_task_page, variant='slim')
+        if data is None:
+            raise RuntimeError('Could not fetch tasks')
+        yield from data['tasks']
+        if data['last_page']:
+            return
+        page += 1
+
+def get_clickup_tasks_for_project(project_key, limit=None, order_by='due_date'):
+    """Get open tasks for a specific project (at most limit, soonest due first)"""
+    try:
+        # Get the list ID for this project
+        project = SETTINGS.get('projects', {}).get(project_key)
+        if not project:
+            return {'success': False, 'error': 'Project not found'}
+        
+        # ClickUp's default order is descending, so reverse for soonest first
+        tasks = iter_list_tasks(project['list_id'], order_by=order_by, reverse=order_by == 'due_date')
+        return {'success': True, 'tasks': list(islice(tasks, limit))}
+            
+    except Exception as e:
+        print(f"Error fetching tasks: {e}")
+        return {'success': False, 'error': str(e)}
+
+# Local task index so "done <name>" / "done <short id>" don't scan every list
+TASK_INDEX_POLL_SECONDS = int(os.getenv('TASK_INDEX_POLL_SECONDS', '60'))
+TASK_INDEX_WAIT = float(os.getenv('TASK_INDEX_WAIT', '5'))  # longest a lookup waits for the first load
+CLICKUP_WEBHOOK_SECRET = os.getenv('CLICKUP_WEBHOOK_SECRET', '')
+
+# ClickUp ids ("86b1x2y3z") and short ids ("x2y3z") - digits, no spaces
+TASK_ID_RE = re.compile(r'^(?=[a-z]*\d)[a-z0-9]{5,12}$|^\d+$', re.IGNORECASE)
+NAME_TOKEN_MIN = 3
+TASK_CANDIDATES_SHOWN = 5
+
+def _name_tokens(text):
+    """Lowercase alphanumeric tokens used for name lookups"""
+    return set(re.findall(r'[a-z0-9]+', (text or '').lower()))
+
+class TaskIndex:
+    """In-process index of open ClickUp tasks by id, short id and name tokens"""
+
+    CLOSED_TYPES = ('closed', 'done')
+
+    def __init__(self, poll_seconds=60):
+        self.poll_seconds = poll_seconds
+        self._lock = threading.RLock()
+        self._tasks = {}          # task id -> {'id', 'name', 'list_id', 'updated'}
+        self._by_short = {}       # last 5 chars of id -> set of ids
+        self._by_token = {}       # name token -> set of ids
+        self._sorted_tokens = []  # for prefix lookups with bisect
+        self._tokens_dirty = False
+        self.loaded_at = None
+        self.polled_at = None
+        self._refresh_lock = threading.Lock()  # one load/poll at a time
+        self._loaded = threading.Event()
+        self._warming = False
+        self._pending = set()     # task ids to refetch after a webhook
+        self._refetching = False
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def _remove_locked(self, task_id):
+        entry = self._tasks.pop(task_id, None)
+        if not entry:
+            return
+        short_ids = self._by_short.get(task_id[-5:])
+        if short_ids:
+            short_ids.discard(task_id)
+            if not short_ids:
+                del self._by_short[task_id[-5:]]
+        for token in _name_tokens(entry['name']):
+            ids = self._by_token.get(token)
+            if ids:
+                ids.discard(task_id)
+                if not ids:
+                    del self._by_token[token]
+                    self._tokens_dirty = True
+
+    def upsert(self, task):
+        """Add or refresh a task from a ClickUp task object (closed tasks are dropped)"""
+        task_id = task.get('id')
+        if not task_id:
+            return
+        status_type = (task.get('status') or {}).get('type', 'open')
+        with self._lock:
+            self._remove_locked(task_id)
+            if status_type in self.CLOSED_TYPES:
+                return
+            self._tasks[task_id] = {
+                'id': task_id,
+                'name': task.get('name', ''),
+                'list_id': (task.get('list') or {}).get('id'),
+                'updated': int(task.get('date_updated') or 0)
+            }
+            self._by_short.setdefault(task_id[-5:], set()).add(task_id)
+            for token in _name_tokens(task.get('name')):
+                if token not in self._by_token:
+                    self._by_token[token] = set()
+                    self._tokens_dirty = True
+                self._by_token[token].add(task_id)
+
+    def remove(self, task_id):
+        with self._lock:
+            self._remove_locked(task_id)
+
+    def _ids_with_prefix(self, prefix):
+        if self._tokens_dirty:
+            self._sorted_tokens = sorted(self._by_token)
+            self._tokens_dirty = False
+        ids = set()
+        i = bisect.bisect_left(self._sorted_tokens, prefix)
+        while i < len(self._sorted_tokens) and self._sorted_tokens[i].startswith(prefix):
+            ids |= self._by_token[self._sorted_tokens[i]]
+            i += 1
+        return ids
+
+    def find(self, identifier):
+        """Task ids matching a task id, short id or partial name, best match first
+
+        Anything that looks like an id is only looked up as one. A name lookup
+        needs at least one token of NAME_TOKEN_MIN characters and returns every
+        open task that matches, so callers can ask which one was meant.
+        """
+        identifier = identifier.strip().lstrip('#')
+        lower = identifier.lower()
+        with self._lock:
+            if identifier in self._tasks:
+                return [identifier]
+            if TASK_ID_RE.match(identifier):
+                short_ids = self._by_short.get(identifier) or self._by_short.get(lower) or ()
+                return sorted(short_ids, key=lambda tid: self._tasks[tid]['updated'], reverse=True)
+
+            # Short tokens ("a", "in", "2") prefix-match nearly everything
+            tokens = [token for token in re.findall(r'[a-z0-9]+', lower) if len(token) >= NAME_TOKEN_MIN]
+            if not tokens:
+                return []
+            candidates = None
+            for token in tokens:
+                ids = self._ids_with_prefix(token)
+                candidates = ids if candidates is None else candidates & ids
+                if not candidates:
+                    return []
+
+            # The full name typed out picks that task
+            exact = [tid for tid in candidates if self._tasks[tid]['name'].strip().lower() == lower]
+            if exact:
+                candidates = exact
+            return sorted(
+                candidates,
+                key=lambda tid: (lower in self._tasks[tid]['name'].lower(), self._tasks[tid]['updated']),
+                reverse=True
+            )
+
+    def describe(self, task_ids):
+        """(id, name) pairs for candidate lists"""
+        with self._lock:
+            return [(tid, self._tasks[tid]['name']) for tid in task_ids if tid in self._tasks]
+
+    def _fetch_team_tasks(self, list_ids, extra_params=None):
+        """Paginate through the team task endpoint, yielding task objects"""
+        page = 0
+        while True:
+            params = {'page': page, 'subtasks': 'true', 'list_ids[]': list_ids}
+            params.update(extra_params or {})
+            response = clickup.get(f'/team/{WORKSPACE_ID}/task', params=params, timeout=15,
+                                   priority='background')
+            if response.status_code != 200:
+                raise RuntimeError(f'task fetch failed: {response.status_code}')
+            data = response.json()
+            tasks = data.get('tasks', [])
+            for task in tasks:
+                yield task
+            if data.get('last_page') or len(tasks) < 100:
+                return
+            page += 1
+
+    def refresh(self):
+        """Full rebuild from paginated bulk fetches of every project list"""
+        list_ids = [p['list_id'] for p in SETTINGS.get('projects', {}).values() if p.get('list_id')]
+        started = time.time()
+        tasks = list(self._fetch_team_tasks(list_ids)) if list_ids else []
+        with self._lock:
+            self._tasks.clear()
+            self._by_short.clear()
+            self._by_token.clear()
+            self._tokens_dirty = True
+            for task in tasks:
+                self.upsert(task)
+            self.loaded_at = self.polled_at = started
+        print(f"🗂️  Task index loaded: {len(self)} open tasks")
+
+    def poll(self):
+        """Delta refresh - only tasks updated since the last poll"""
+        list_ids = [p['list_id'] for p in SETTINGS.get('projects', {}).values() if p.get('list_id')]
+        started = time.time()
+        since = int((self.polled_at - 5) * 1000)  # small overlap for clock skew
+        for task in self._fetch_team_tasks(list_ids, {
+            'date_updated_gt': since,
+            'include_closed': 'true'
+        }):
+            self.upsert(task)
+        self.polled_at = started
+
+    def _needs_refresh(self):
+        return self.loaded_at is None or time.time() - self.polled_at > self.poll_seconds
+
+    def _refresh_in_background(self):
+        try:
+            with self._refresh_lock:
+                if self.loaded_at is None:
+                    self.refresh()
+                    self._loaded.set()
+                elif self._needs_refresh():
+                    self.poll()
+        except Exception as e:
+            print(f"Task index refresh error: {e}")
+        finally:
+            with self._lock:
+                self._warming = False
+
+    def warm(self):
+        """Start a load (or delta poll) on a background thread unless one is running"""
+        with self._lock:
+            if self._warming:
+                return
+            self._warming = True
+        threading.Thread(target=self._refresh_in_background, name='task-index', daemon=True).start()
+
+    def _refetch_pending(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._refetching = False
+                    return
+                task_id = self._pending.pop()
+            try:
+                response = clickup.get(f'/task/{task_id}', timeout=10, priority='background')
+                if response.status_code == 200:
+                    self.upsert(response.json())
+                elif response.status_code == 404:
+                    self.remove(task_id)
+            except Exception as e:
+                print(f"Webhook index update error: {e}")
+
+    def refetch_later(self, task_id):
+        """Queue a task for refetching on one background thread (repeat events collapse)"""
+        with self._lock:
+            self._pending.add(task_id)
+            if self._refetching:
+                return
+            self._refetching = True
+        threading.Thread(target=self._refetch_pending, name='task-index-webhook', daemon=True).start()
+
+    def ensure_fresh(self, wait=None):
+        """Load on first use, delta-poll once the poll interval has passed
+
+        Refreshes run in the background, one at a time. Only the very first
+        load is waited for, and at most `wait` seconds.
+        """
+        if self._needs_refresh():
+            self.warm()
+        if self.loaded_at is None:
+            self._loaded.wait(TASK_INDEX_WAIT if wait is None else wait)
+
+    def stats(self):
+        return {
+            'tasks': len(self._tasks),
+            'tokens': len(self._by_token),
+            'loaded_at': self.loaded_at,
+            'polled_at': self.polled_at
+        }
+
+task_index = TaskIndex(poll_seconds=TASK_INDEX_POLL_SECONDS)
 
 def mark_task_complete(task_identifier):
-    """Mark a task as complete by ID or partial match"""
-    headers = {
-        'Authorization': CLICKUP_KEY,
-        'Content-Type': 'application/json'
-    }
-    
+    """Mark a task as complete by ID, short ID or partial name match"""
     try:
-        # First try to find the task
         task_id = None
+        task_identifier = task_identifier.strip().lstrip('#')
+        
+        try:
+            task_index.ensure_fresh()
+            matches = task_index.find(task_identifier)
+        except Exception as e:
+            print(f"Task index unavailable: {e}")
+            matches = []
         
-        if task_identifier.isdigit() or len(task_identifier) <= 10:
-            # Direct task ID or short ID
+        if len(matches) > 1:
+            # Never guess on a destructive command - let the sender pick
+            return {
+                'success': False,
+                'error': 'Several tasks match',
+                'candidates': task_index.describe(matches[:TASK_CANDIDATES_SHOWN]),
+                'match_count': len(matches)
+            }
+        if matches:
+            task_id = matches[0]
+        elif TASK_ID_RE.match(task_identifier):
+            # Not indexed - treat as a direct ClickUp task ID
             task_id = task_identifier
-        else:
-            # Search for task by name across all lists
-            for project_key, project in SETTINGS.get('projects', {}).items():
-                list_id = project['list_id']
-                response = requests.get(
-                    f'{BASE_URL}/list/{list_id}/task',
-                    headers=headers,
-                    params={'archived': 'false'},
-                    timeout=10
-                )
-                
-                if response.status_code == 200:
-                    tasks = response.json().get('tasks', [])
-                    for task in tasks:
-                        # Check if identifier matches task name or ID
-                        if (task_identifier.lower() in task['name'].lower() or 
-                            task_identifier in task.get('id', '') or
-                            task.get('id', '').endswith(task_identifier)):
-                            task_id = task['id']
-                            break
-                
-                if task_id:
-                    break
         
         if not task_id:
             return {'success': False, 'error': 'Task not found'}
         
         # Update task status to complete
-        update_response = requests.put(
-            f'{BASE_URL}/task/{task_id}',
-            headers=headers,
+        update_response = clickup.put(
+            f'/task/{task_id}',
             json={'status': 'complete'},
             timeout=10
         )
         
         if update_response.status_code == 200:
+            task_index.remove(task_id)
+            try:
+                invalidate_list_reads(update_response.json().get('list', {}).get('id'))
+            except ValueError:
+                pass
             return {'success': True, 'task_id': task_id}
         else:
             return {'success': False, 'error': 'Could not update task'}
@@ -1587,17 +4092,35 @@ def mark_task_complete(task_identifier):
         print(f"Error marking task complete: {e}")
         return {'success': False, 'error': str(e)}
 
+@app.route('/clickup/webhook', methods=['POST'])
+def clickup_webhook():
+    """ClickUp webhook receiver that keeps the task index current"""
+    # Disabled without a secret, like the admin routes
+    if not CLICKUP_WEBHOOK_SECRET:
+        return jsonify({'success': False, 'error': 'Webhook secret not configured'}), 401
+    expected = hmac.new(CLICKUP_WEBHOOK_SECRET.encode(), request.get_data(),
+                        hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, request.headers.get('X-Signature', '')):
+        return jsonify({'success': False, 'error': 'Bad signature'}), 401
+    
+    event = request.get_json(silent=True) or {}
+    task_id = event.get('task_id')
+    if not task_id:
+        return jsonify({'success': True})
+    
+    if event.get('event') == 'taskDeleted':
+        task_index.remove(task_id)
+    else:
+        # The refetch can queue behind the rate limiter - never in the request
+        task_index.refetch_later(task_id)
+    
+    return jsonify({'success': True})
+
 def add_comment_to_task(task_id, comment_text):
     """Add a comment/update to a task"""
-    headers = {
-        'Authorization': CLICKUP_KEY,
-        'Content-Type': 'application/json'
-    }
-    
     try:
-        response = requests.post(
-            f'{BASE_URL}/task/{task_id}/comment',
-            headers=headers,
+        response = clickup.post(
+            f'/task/{task_id}/comment',
             json={
                 'comment_text': comment_text,
                 'notify_all': False
@@ -1644,31 +4167,16 @@ def build_task_from_ai_result(ai_result, original_message, from_number):
 def create_clickup_task(task_info):
     """Create a task in ClickUp (without attachment)"""
     
-    headers = {
-        'Authorization': CLICKUP_KEY,
-        'Content-Type': 'application/json'
-    }
-    
     try:
         # Get list ID if not specified
         list_id = task_info.get('list_id')
         
         if not list_id:
-            # Get the first available list
-            list_response = requests.get(
-                f'{BASE_URL}/team/{WORKSPACE_ID}/list',
-                headers=headers,
-                timeout=10
-            )
-            
-            if list_response.status_code != 200:
-                return {'success': False, 'error': 'Could not find lists'}
-            
-            lists = list_response.json().get('lists', [])
-            if not lists:
-                return {'success': False, 'error': 'No lists found. Create a project first.'}
-            
-            list_id = lists[0]['id']
+            # Fall back to the cached default list
+            default = get_default_list_id()
+            if not default['success']:
+                return default
+            list_id = default['list_id']
         
         # Create task data
         task_data = {
@@ -1684,15 +4192,17 @@ def create_clickup_task(task_info):
             task_data['due_date'] = int(due_date.timestamp() * 1000)
         
         # Create the task
-        task_response = requests.post(
-            f'{BASE_URL}/list/{list_id}/task',
-            headers=headers,
+        task_response = clickup.post(
+            f'/list/{list_id}/task',
             json=task_data,
             timeout=10
         )
         
         if task_response.status_code == 200:
-            return {'success': True, 'task': task_response.json()}
+            task = task_response.json()
+            task_index.upsert(task)
+            invalidate_list_reads(list_id)
+            return {'success': True, 'task': task}
         else:
             print(f"Error creating task: {task_response.text}")
             return {'success': False, 'error': 'Could not create task'}
@@ -1701,29 +4211,431 @@ def create_clickup_task(task_info):
         print(f"Error creating ClickUp task: {e}")
         return {'success': False, 'error': str(e)}
 
+# Background job queue for async SMS processing
+class SMSJobQueue:
+    """SQLite-backed job queue shared by every worker process on the host"""
+
+    def __init__(self, db_path, max_attempts=3, visibility_timeout=300):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.visibility_timeout = visibility_timeout
+        self._local = threading.local()
+        self._ready = False
+        self._init_lock = threading.Lock()
+        self.wakeup = threading.Event()
+
+    def _conn(self):
+        """One connection per thread; schema is created on first use"""
+        conn = thread_connection(self._local)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        if not self._ready:
+            with self._init_lock:
+                if not self._ready:
+                    conn.execute('''
+                        CREATE TABLE IF NOT EXISTS sms_jobs (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            payload TEXT NOT NULL,
+                            status TEXT NOT NULL DEFAULT 'queued',
+                            attempts INTEGER NOT NULL DEFAULT 0,
+                            enqueued_at REAL NOT NULL,
+                            available_at REAL NOT NULL,
+                            started_at REAL,
+                            finished_at REAL,
+                            error TEXT
+                        )
+                    ''')
+                    conn.execute('CREATE INDEX IF NOT EXISTS idx_sms_jobs_ready '
+                                 'ON sms_jobs (status, available_at)')
+                    columns = [row[1] for row in conn.execute('PRAGMA table_info(sms_jobs)')]
+                    if 'priority' not in columns:
+                        # Queues created before the safety lane
+                        conn.execute('ALTER TABLE sms_jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 0')
+                    if 'reply' not in columns:
+                        conn.execute('ALTER TABLE sms_jobs ADD COLUMN reply TEXT')
+                    self._ready = True
+        return conn
+
+    def enqueue(self, payload, priority=0):
+        """Add a job and return its id; higher priority jobs are claimed first"""
+        now = time.time()
+        cur = self._conn().execute(
+            'INSERT INTO sms_jobs (payload, enqueued_at, available_at, priority) VALUES (?, ?, ?, ?)',
+            (json.dumps(payload), now, now, priority)
+        )
+        self.wakeup.set()
+        return cur.lastrowid
+
+    def claim(self, min_priority=0):
+        """Atomically take the highest priority, oldest ready job, or return None"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Jobs left running by a crashed worker become visible again
+            conn.execute(
+                "UPDATE sms_jobs SET status = 'queued' WHERE status = 'running' AND started_at < ?",
+                (now - self.visibility_timeout,)
+            )
+            row = conn.execute(
+                "SELECT id, payload, attempts, reply FROM sms_jobs WHERE status = 'queued' "
+                "AND available_at <= ? AND priority >= ? ORDER BY priority DESC, id LIMIT 1",
+                (now, min_priority)
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE sms_jobs SET status = 'running', started_at = ?, "
+                    "attempts = attempts + 1 WHERE id = ?",
+                    (now, row[0])
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        if not row:
+            return None
+        return {'id': row[0], 'payload': json.loads(row[1]), 'attempts': row[2] + 1, 'reply': row[3]}
+
+    def save_reply(self, job_id, reply):
+        """Record the pipeline's result so a retry only resends the reply"""
+        self._conn().execute('UPDATE sms_jobs SET reply = ? WHERE id = ?', (reply, job_id))
+
+    def touch(self, job_id):
+        """Extend a running job's visibility timeout"""
+        self._conn().execute(
+            "UPDATE sms_jobs SET started_at = ? WHERE id = ? AND status = 'running'",
+            (time.time(), job_id)
+        )
+
+    @contextmanager
+    def heartbeat(self, job_id):
+        """Keep a long job from being reclaimed by another worker while it runs"""
+        stop = threading.Event()
+        
+        def beat():
+            while not stop.wait(self.visibility_timeout / 3):
+                try:
+                    self.touch(job_id)
+                except Exception as e:
+                    print(f"SMS queue heartbeat error: {e}")
+        
+        thread = threading.Thread(target=beat, name=f'sms-heartbeat-{job_id}', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+
+    def complete(self, job_id):
+        self._conn().execute(
+            "UPDATE sms_jobs SET status = 'done', finished_at = ?, error = NULL WHERE id = ?",
+            (time.time(), job_id)
+        )
+
+    def fail(self, job_id, attempts, error):
+        """Reschedule with exponential backoff, or mark dead after max attempts"""
+        now = time.time()
+        if attempts >= self.max_attempts:
+            self._conn().execute(
+                "UPDATE sms_jobs SET status = 'dead', finished_at = ?, error = ? WHERE id = ?",
+                (now, str(error), job_id)
+            )
+        else:
+            self._conn().execute(
+                "UPDATE sms_jobs SET status = 'queued', available_at = ?, error = ? WHERE id = ?",
+                (now + 2 ** attempts, str(error), job_id)
+            )
+
+    def purge(self, older_than=86400):
+        """Drop finished jobs older than the given age in seconds"""
+        self._conn().execute(
+            "DELETE FROM sms_jobs WHERE status IN ('done', 'dead') AND finished_at < ?",
+            (time.time() - older_than,)
+        )
+
+    def stats(self, window=3600):
+        """Queue depth, end-to-end latency and retry counts"""
+        conn = self._conn()
+        counts = dict(conn.execute(
+            'SELECT status, COUNT(*) FROM sms_jobs GROUP BY status'
+        ).fetchall())
+
+        latencies = [row[0] for row in conn.execute(
+            "SELECT finished_at - enqueued_at FROM sms_jobs WHERE status = 'done' "
+            "AND finished_at > ? ORDER BY 1",
+            (time.time() - window,)
+        ).fetchall()]
+
+        retried = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(attempts - 1), 0) FROM sms_jobs WHERE attempts > 1'
+        ).fetchone()
+
+        oldest = conn.execute(
+            "SELECT MIN(enqueued_at) FROM sms_jobs WHERE status = 'queued'"
+        ).fetchone()[0]
+        safety_depth = conn.execute(
+            "SELECT COUNT(*) FROM sms_jobs WHERE status = 'queued' AND priority > 0"
+        ).fetchone()[0]
+
+        def pct(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000)
+
+        return {
+            'depth': counts.get('queued', 0),
+            'safety_depth': safety_depth,
+            'running': counts.get('running', 0),
+            'done': counts.get('done', 0),
+            'dead': counts.get('dead', 0),
+            'oldest_queued_age_s': round(time.time() - oldest, 1) if oldest else 0,
+            'latency_ms': {'p50': pct(0.5), 'p95': pct(0.95), 'max': pct(1.0),
+                           'samples': len(latencies)},
+            'retried_jobs': retried[0],
+            'retries': retried[1]
+        }
+
+sms_queue = SMSJobQueue(SMS_QUEUE_DB, max_attempts=SMS_MAX_ATTEMPTS)
+
+_sms_workers = []
+_sms_workers_pid = None
+_sms_workers_lock = threading.Lock()
+
+def send_sms_reply(to_number, body):
+    """Send an outbound SMS through the Twilio REST API"""
+    if not (TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN and TWILIO_PHONE_NUMBER):
+        raise RuntimeError('Twilio REST credentials not configured')
+
+    from twilio.rest import Client
+    client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+    client.messages.create(to=to_number, from_=TWILIO_PHONE_NUMBER, body=body)
+
+def sms_worker_loop(min_priority=0):
+    """Pull jobs off the queue, run the SMS pipeline and text back the result
+
+    Safety-lane workers (min_priority=1) only take safety jobs, so those
+    never wait behind a slow transcription or upload.
+    """
+    last_purge = 0
+    while True:
+        try:
+            job = sms_queue.claim(min_priority)
+            if not job and time.time() - last_purge > 3600:
+                sms_queue.purge()
+                last_purge = time.time()
+        except Exception as e:
+            print(f"SMS queue error: {e}")
+            job = None
+
+        if not job:
+            # Woken immediately by local enqueues; poll for other workers' jobs
+            sms_queue.wakeup.wait(1.0)
+            sms_queue.wakeup.clear()
+            continue
+
+        form = job['payload']
+        try:
+            msg = job['reply']
+            if msg is None:
+                refresh_settings()
+                with sms_queue.heartbeat(job['id']):
+                    msg = process_sms_message(form)
+                # Saved before replying: a failed send must not create the task again
+                sms_queue.save_reply(job['id'], msg)
+            else:
+                print(f"↩️  SMS job {job['id']} already processed - resending reply only")
+            send_sms_reply(form.get('From'), msg)
+            sms_queue.complete(job['id'])
+            print(f"✅ SMS job {job['id']} done")
+        except Exception as e:
+            print(f"SMS job {job['id']} failed (attempt {job['attempts']}): {e}")
+            sms_queue.fail(job['id'], job['attempts'], e)
+
+def ensure_sms_workers():
+    """Start the worker threads once per process (after any gunicorn fork)"""
+    global _sms_workers, _sms_workers_pid
+    pid = os.getpid()
+    if _sms_workers_pid == pid:
+        return
+    with _sms_workers_lock:
+        if _sms_workers_pid == pid:
+            return
+        _sms_workers = []
+        for i in range(SMS_WORKERS):
+            worker = threading.Thread(target=sms_worker_loop, name=f'sms-worker-{i}', daemon=True)
+            worker.start()
+            _sms_workers.append(worker)
+        for i in range(SAFETY_WORKERS):
+            worker = threading.Thread(target=sms_worker_loop, args=(1,), name=f'sms-safety-{i}', daemon=True)
+            worker.start()
+            _sms_workers.append(worker)
+        _sms_workers_pid = pid
+        print(f"🧵 Started {SMS_WORKERS} SMS workers + {SAFETY_WORKERS} safety")
+
+@app.route('/api/queue/stats', methods=['GET'])
+def queue_stats():
+    """Async SMS queue depth, latency and retry metrics"""
+    try:
+        stats = sms_queue.stats()
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    stats['async_mode'] = SMS_ASYNC_MODE
+    stats['workers'] = len(_sms_workers) if _sms_workers_pid == os.getpid() else 0
+    return jsonify(stats)
+
+def attachment_summary(created):
+    """Reply lines saying how many photos made it onto the task
+
+    Photos already uploaded to another task are only linked in the
+    description, so they are reported separately.
+    """
+    total = created.get('attachment_total', 0)
+    attached = created.get('attached', 0)
+    linked = created.get('linked', 0)
+    summary = ""
+    if total == 1 and attached:
+        summary += "\n📸 Photo attached"
+    elif total and attached:
+        summary += f"\n📸 {attached}/{total} photos attached"
+    if linked:
+        summary += f"\n📎 {'Photo' if linked == 1 else f'{linked} photos'} already on another task - linked in description"
+    return summary
+
+def is_safety_message(text):
+    lower = (text or '').lower()
+    return any(word in lower for word in SAFETY_KEYWORDS)
+
+# "Text received -> task created" latency per lane
+SMS_LATENCY = {'safety': deque(maxlen=1000), 'normal': deque(maxlen=1000)}
+SMS_SLO_BREACHES = {'safety': 0, 'normal': 0}
+_sms_latency_lock = threading.Lock()
+
+def record_task_latency(lane, received_at):
+    if not received_at:
+        return
+    seconds = time.time() - received_at
+    slo = SAFETY_SLO_SECONDS if lane == 'safety' else NORMAL_SLO_SECONDS
+    with _sms_latency_lock:
+        SMS_LATENCY[lane].append(seconds)
+        if seconds > slo:
+            SMS_SLO_BREACHES[lane] += 1
+    if seconds > slo:
+        print(f"⚠️  {lane} task took {seconds:.1f}s (SLO {slo:.0f}s)")
+
+def sms_latency_stats():
+    with _sms_latency_lock:
+        samples = {lane: sorted(values) for lane, values in SMS_LATENCY.items()}
+        breaches = dict(SMS_SLO_BREACHES)
+    
+    def pct(values, p):
+        if not values:
+            return None
+        return round(values[min(len(values) - 1, int(len(values) * p))] * 1000)
+    
+    return {
+        lane: {
+            'p50_ms': pct(values, 0.5),
+            'p99_ms': pct(values, 0.99),
+            'samples': len(values),
+            'slo_s': SAFETY_SLO_SECONDS if lane == 'safety' else NORMAL_SLO_SECONDS,
+            'slo_breaches': breaches[lane]
+        }
+        for lane, values in samples.items()
+    }
+
+def create_safety_task(message_body, from_number, received_at, image_data=None, media_url=None):
+    """Create a top-priority safety task using the reserved ClickUp rate share"""
+    project_match = detect_project_from_message(message_body)
+    task_info = {
+        'type': 'create_task',
+        'name': message_body,
+        'display_name': f"🚨 SAFETY: {message_body}",
+        'priority': 1,
+        'list_id': project_match[0] if project_match[0] else None,
+        'description': f"⚠️ SAFETY ISSUE\nFrom: {from_number}\n{datetime.now().strftime('%Y-%m-%d %H:%M')}",
+        'media_url': media_url
+    }
+    
+    with clickup_priority('safety'):
+        if image_data:
+            created = create_clickup_task_with_attachment(task_info, image_data)
+        else:
+            created = create_clickup_task(task_info)
+    
+    if created['success']:
+        record_task_latency('safety', received_at)
+    return created
+
+def attach_media_to_task(task_id, media, message_body, from_number, description=''):
+    """Add the voice notes and photos of an already-created task; returns attachment counts
+
+    Photos that could not be downloaded or uploaded are linked in the
+    description by their media URL, as for a normal photo task.
+    """
+    for item in media:
+        if 'audio' in item['content_type']:
+            transcription = handle_audio_mms_simple(item['url'], from_number)
+            if transcription:
+                add_comment_to_task(task_id, f"🎤 {transcription}")
+    
+    images = [item for item in media if 'image' in item['content_type']]
+    if not images:
+        return {}
+    downloaded = download_mms_images(images, message_body, from_number)
+    attachments = normalize_attachments(downloaded, {}) if downloaded else []
+    results = upload_attachments(task_id, attachments) if attachments else []
+    uploaded = {a['media_url'] for a, ok in zip(attachments, results) if ok}
+    failed_urls = [item['url'] for item in images if item['url'] not in uploaded]
+    linked_urls = [a['linked_url'] for a in attachments if a.get('linked_url')]
+    add_photo_links(task_id, description, failed_urls, linked_urls)
+    return {
+        'attached': sum(1 for ok in results if ok) - len(linked_urls),
+        'linked': len(linked_urls),
+        'attachment_total': len(images)
+    }
+
+def safety_reply(created):
+    if not created['success']:
+        return "❌ Failed safety task!"
+    return f"🚨 SAFETY CREATED\nID: {created['task']['id'][-5:]}" + attachment_summary(created)
+
 # Enhanced SMS handler with fixed MMS support - COMPLETE VERSION
-@app.route('/sms', methods=['POST'])
-def handle_sms():
-    """Enhanced SMS handler with working MMS photo and simple voice support"""
+def process_sms_message(form):
+    """Run the SMS pipeline for one inbound message and return the reply text"""
     
-    from_number = request.form.get('From', '')
-    message_body = request.form.get('Body', '').strip()
-    media_url = request.form.get('MediaUrl0', '')
-    num_media = request.form.get('NumMedia', '0')
+    from_number = form.get('From', '')
+    message_body = form.get('Body', '').strip()
+    media = collect_media(form)
+    received_at = float(form.get('_received_at') or time.time())
     
     print(f"📱 SMS from {from_number}: {message_body}")
     
+    # A safety report in the text gets its task before any voice or photo work
+    if message_body and is_safety_message(message_body) and media and CLICKUP_KEY and WORKSPACE_ID:
+        try:
+            created = create_safety_task(message_body, from_number, received_at)
+            if created['success']:
+                with clickup_priority('safety'):
+                    created.update(attach_media_to_task(created['task']['id'], media, message_body, from_number,
+                                                        created['task'].get('description') or ''))
+            return safety_reply(created)
+        except Exception as e:
+            print(f"SMS error: {e}")
+            return "Error. Text 'help'"
+    
     # Check for media attachments
-    if num_media != '0':
-        print(f"📸 MMS with {num_media} media files")
-        
-        # Check if it's audio
-        media_type = request.form.get('MediaContentType0', '')
-        print(f"Media type: {media_type}")
+    if media:
+        print(f"📸 MMS with {len(media)} media files: {[m['content_type'] for m in media]}")
         
         # Handle voice messages
-        if media_type and 'audio' in media_type:
-            transcription = handle_audio_mms_simple(media_url, from_number)
+        for item in media:
+            if 'audio' not in item['content_type']:
+                continue
+            transcription = handle_audio_mms_simple(item['url'], from_number)
             if transcription:
                 # Use transcription as the message
                 if not message_body:
@@ -1736,8 +4648,6 @@ def handle_sms():
                 if not message_body:
                     message_body = "voice message received"
     
-    resp = MessagingResponse()
-    
     try:
         lower = message_body.lower()
         
@@ -1752,21 +4662,20 @@ def handle_sms():
             msg += "🚨 safety issue\n"
             msg += "📸 Send photo\n"
             msg += "🎤 Send voice"
-            resp.message(msg)
-            return str(resp), 200, {'Content-Type': 'text/xml'}
+            return msg
         
         # List tasks for a project
         if lower.startswith('list'):
             parts = message_body.split(' ', 1)
             if len(parts) > 1:
                 project_key = parts[1].strip().lower()
-                result = get_clickup_tasks_for_project(project_key)
+                result = get_clickup_tasks_for_project(project_key, limit=10)
                 
                 if result['success']:
                     tasks = result['tasks']
                     if tasks:
                         msg = f"Tasks for {project_key}:\n"
-                        for i, task in enumerate(tasks[:10], 1):
+                        for i, task in enumerate(tasks, 1):
                             task_id_short = task['id'][-5:]
                             name = task['name'][:30]
                             msg += f"{task_id_short}: {name}\n"
@@ -1781,8 +4690,7 @@ def handle_sms():
             else:
                 msg = "Usage: list [project]"
             
-            resp.message(msg)
-            return str(resp), 200, {'Content-Type': 'text/xml'}
+            return msg
         
         # Mark task as done
         if lower.startswith('done'):
@@ -1797,13 +4705,16 @@ def handle_sms():
                         result['task_id'],
                         f"Completed via SMS from {from_number}"
                     )
+                elif result.get('candidates'):
+                    msg = f"❓ {result['match_count']} tasks match:\n" + "\n".join(
+                        f"#{tid[-5:]} {name[:40]}" for tid, name in result['candidates']
+                    ) + "\nReply done #id"
                 else:
                     msg = f"❌ Could not complete task"
             else:
                 msg = "Usage: done [task#]"
             
-            resp.message(msg)
-            return str(resp), 200, {'Content-Type': 'text/xml'}
+            return msg
         
         # Status command - show projects with task counts
         if lower == "status":
@@ -1829,64 +4740,39 @@ def handle_sms():
                     msg += f"\n+{len(keys) - shown} more"
             else:
                 msg = "No projects yet\nText: create project [name]"
-    
-        resp.message(msg)
-        return str(resp), 200, {'Content-Type': 'text/xml'}
+            
+            return msg
         
-        # Handle photo attachments (YOUR EXISTING WORKING CODE)
+        # Handle photo attachments - every image slot, downloaded concurrently
         image_data = None
         media_url_backup = None
-        if num_media != '0' and media_url:
-            media_type = request.form.get('MediaContentType0', '')
-            # Only process images (not audio, which we handled above)
-            if media_type and 'image' in media_type:
-                mms_result = handle_mms_image(media_url, message_body, from_number)
-                if mms_result['has_image']:
-                    image_data = mms_result['image_data']
-                    media_url_backup = mms_result.get('media_url')
-                    if not message_body:
-                        message_body = "Site photo"
-                    message_body = f"📸 {message_body}"
+        images = [item for item in media if 'image' in item['content_type']]
+        if images:
+            downloaded = download_mms_images(images, message_body, from_number)
+            if downloaded:
+                image_data = downloaded
+                media_url_backup = downloaded[0].get('media_url')
+                if not message_body:
+                    message_body = "Site photo" if len(downloaded) == 1 else f"{len(downloaded)} site photos"
+                message_body = f"📸 {message_body}"
         
         # Safety issue detection
-        if any(word in lower for word in ['safety', 'danger', 'hazard', 'emergency', 'urgent', 'accident']):
-            project_match = detect_project_from_message(message_body)
-            task_info = {
-                'type': 'create_task',
-                'name': message_body,
-                'display_name': f"🚨 SAFETY: {message_body}",
-                'priority': 1,
-                'list_id': project_match[0] if project_match[0] else None,
-                'description': f"⚠️ SAFETY ISSUE\nFrom: {from_number}\n{datetime.now().strftime('%Y-%m-%d %H:%M')}",
-                'media_url': media_url_backup
-            }
-            
+        if is_safety_message(lower):
             # Create the safety task immediately
             if CLICKUP_KEY and WORKSPACE_ID:
-                if image_data:
-                    created = create_clickup_task_with_attachment(task_info, image_data)
-                else:
-                    created = create_clickup_task(task_info)
-                    
-                if created['success']:
-                    task_id_short = created['task']['id'][-5:]
-                    msg = f"🚨 SAFETY CREATED\nID: {task_id_short}"
-                else:
-                    msg = f"❌ Failed safety task!"
+                created = create_safety_task(message_body, from_number, received_at,
+                                             image_data=image_data, media_url=media_url_backup)
+                msg = safety_reply(created)
             else:
                 msg = "System not configured!"
             
-            resp.message(msg)
-            return str(resp), 200, {'Content-Type': 'text/xml'}
-        
-        # Try OpenAI if available for complex messages
-        if OPENAI_API_KEY and len(message_body) > 15:
-            ai_result = parse_with_openai(message_body)
-            if ai_result and ai_result.get('type') == 'create_task':
-                task_info = build_task_from_ai_result(ai_result, message_body, from_number)
-                task_info['media_url'] = media_url_backup  # Add for fallback
-            else:
-                task_info = parse_command_simple(message_body)
+            return msg
+        
+        # Local parser first, OpenAI only when it isn't confident
+        ai_result = parse_task_tiered(message_body)
+        if ai_result and ai_result.get('type') == 'create_task':
+            task_info = build_task_from_ai_result(ai_result, message_body, from_number)
+            task_info['media_url'] = media_url_backup  # Add for fallback
         else:
             task_info = parse_command_simple(message_body)
         
@@ -1915,11 +4801,11 @@ def handle_sms():
                     created = create_clickup_task(task_info)
                     
                 if created['success']:
+                    record_task_latency('normal', received_at)
                     task_id_short = created['task']['id'][-5:]
                     name = task_info.get('display_name', 'Task')[:30]
                     msg = f"✅ {name}\nID: {task_id_short}"
-                    if image_data and created.get('attachment'):
-                        msg += "\n📸 Photo attached"
+                    msg += attachment_summary(created)
                 else:
                     msg = f"❌ Failed to create"
             else:
@@ -1932,8 +4818,208 @@ def handle_sms():
         print(f"SMS error: {e}")
         msg = "Error. Text 'help'"
     
-    resp.message(msg)
-    return str(resp), 200, {'Content-Type': 'text/xml'}
+    return msg
+
+class IdempotencyStore:
+    """Once-only processing of webhook requests, shared across workers via SQLite
+
+    The first request for a key claims it; duplicates wait for the claim to
+    finish and replay its stored response. A claim nobody completes within
+    the lease (crashed worker) can be taken over.
+    """
+
+    def __init__(self, db_path, ttl, lease):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.lease = lease
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._events = {}  # key -> threading.Event, for waiters in this process
+        self._last_purge = 0
+        self.counters = {'processed': 0, 'replayed': 0, 'coalesced': 0, 'wait_timeouts': 0,
+                         'taken_over': 0}
+
+    def _conn(self):
+        conn = thread_connection(self._local)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS webhook_requests (key TEXT PRIMARY KEY, '
+                         "status TEXT NOT NULL DEFAULT 'pending', response TEXT, "
+                         'owner INTEGER, created REAL, updated REAL)')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def begin(self, key):
+        """('new', None) if the caller should do the work, ('done', response) or ('pending', None)"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT status, response, created, updated FROM webhook_requests WHERE key = ?', (key,)
+            ).fetchone()
+            if row and row[2] > now - self.ttl:
+                if row[0] == 'done':
+                    conn.execute('COMMIT')
+                    self._count('replayed')
+                    return 'done', row[1]
+                if row[3] > now - self.lease:
+                    conn.execute('COMMIT')
+                    return 'pending', None
+                self._count('taken_over')
+            conn.execute(
+                "INSERT OR REPLACE INTO webhook_requests (key, status, response, owner, created, updated) "
+                "VALUES (?, 'pending', NULL, ?, ?, ?)",
+                (key, os.getpid(), now, now)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        
+        with self._lock:
+            self._events.setdefault(key, threading.Event())
+        self._count('processed')
+        self._purge(now)
+        return 'new', None
+
+    def complete(self, key, response):
+        self._conn().execute(
+            "UPDATE webhook_requests SET status = 'done', response = ?, updated = ? WHERE key = ?",
+            (response, time.time(), key)
+        )
+        self._wake(key)
+
+    def abandon(self, key):
+        """Release a claim whose work failed so a retry can redo it"""
+        self._conn().execute("DELETE FROM webhook_requests WHERE key = ? AND status = 'pending'", (key,))
+        self._wake(key)
+
+    def _wake(self, key):
+        with self._lock:
+            event = self._events.pop(key, None)
+        if event:
+            event.set()
+
+    def wait(self, key, timeout):
+        """Block until another request finishes the key; returns its response or None"""
+        self._count('coalesced')
+        deadline = time.time() + timeout
+        while True:
+            row = self._conn().execute(
+                'SELECT status, response FROM webhook_requests WHERE key = ?', (key,)
+            ).fetchone()
+            if row and row[0] == 'done':
+                return row[1]
+            if not row:
+                # The original gave up - let Twilio's next retry redo it
+                return None
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                self._count('wait_timeouts')
+                return None
+            
+            # Same-process owners wake us directly; other workers are polled
+            with self._lock:
+                event = self._events.get(key)
+            if event:
+                event.wait(min(remaining, 1.0))
+            else:
+                time.sleep(min(remaining, 0.2))
+
+    def _purge(self, now):
+        if now - self._last_purge < 600:
+            return
+        self._last_purge = now
+        try:
+            self._conn().execute('DELETE FROM webhook_requests WHERE created < ?', (now - self.ttl,))
+        except Exception as e:
+            print(f"Idempotency purge error: {e}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        try:
+            rows = self._conn().execute(
+                'SELECT status, COUNT(*) FROM webhook_requests GROUP BY status'
+            ).fetchall()
+            stats.update({f'{status}_keys': count for status, count in rows})
+        except Exception as e:
+            stats['error'] = str(e)
+        return stats
+
+webhook_idempotency = IdempotencyStore(IDEMPOTENCY_DB, IDEMPOTENCY_TTL, IDEMPOTENCY_LEASE)
+
+def twilio_signature_valid(form):
+    """Check X-Twilio-Signature; skipped when validation is off or no auth token is set"""
+    if not (TWILIO_VALIDATE_SIGNATURE and TWILIO_AUTH_TOKEN):
+        return True
+    from twilio.request_validator import RequestValidator
+    url = TWILIO_WEBHOOK_URL or request.url
+    if not TWILIO_WEBHOOK_URL and request.headers.get('X-Forwarded-Proto') == 'https':
+        url = 'https://' + url.split('://', 1)[1]
+    return RequestValidator(TWILIO_AUTH_TOKEN).validate(
+        url, form, request.headers.get('X-Twilio-Signature', '')
+    )
+
+@app.route('/sms', methods=['POST'])
+def handle_sms():
+    """Twilio webhook - reply inline, or enqueue and acknowledge in async mode
+
+    Retries of a MessageSid we've seen replay the first response (waiting
+    for it if the original is still being processed).
+    """
+    started = time.time()
+    form = request.form.to_dict()
+    from twilio.twiml.messaging_response import MessagingResponse
+    resp = MessagingResponse()
+    
+    if not twilio_signature_valid(form):
+        print("⛔ Rejected /sms request with a missing or bad Twilio signature")
+        return str(resp), 403, {'Content-Type': 'text/xml'}
+    
+    if not form.get('From'):
+        return str(resp), 400, {'Content-Type': 'text/xml'}
+    
+    message_sid = form.get('MessageSid')
+    if message_sid:
+        state, cached = webhook_idempotency.begin(message_sid)
+        if state == 'pending':
+            print(f"⏳ Duplicate delivery of {message_sid} - waiting for the original")
+            cached = webhook_idempotency.wait(message_sid, IDEMPOTENCY_WAIT)
+            if cached is None:
+                # Still running (or failed); an empty reply doesn't duplicate the work
+                return str(resp), 200, {'Content-Type': 'text/xml'}
+        if cached is not None:
+            print(f"♻️  Replaying response for {message_sid}")
+            return cached, 200, {'Content-Type': 'text/xml'}
+    
+    try:
+        form['_received_at'] = started
+        if SMS_ASYNC_MODE:
+            # Acknowledge right away; the worker pool replies via the REST API
+            job_id = sms_queue.enqueue(form, priority=1 if is_safety_message(form.get('Body')) else 0)
+            print(f"📥 Queued SMS job {job_id} from {form.get('From')}")
+            ensure_sms_workers()
+        else:
+            msg = process_sms_message(form)
+            resp.message(msg)
+    except Exception:
+        if message_sid:
+            webhook_idempotency.abandon(message_sid)
+        raise
+    
+    body = str(resp)
+    if message_sid:
+        webhook_idempotency.complete(message_sid, body)
+    return body, 200, {'Content-Type': 'text/xml'}
+
 
 def parse_command(message, default_assignee='', project_list_id=None):
     """Full parser for web interface with OpenAI support"""
@@ -1962,20 +5048,7 @@ def parse_command(message, default_assignee='', project_list_id=None):
             return {'type': 'error', 'message': 'Please specify a project name. Example: "create project Oak Street"'}
         
         # Check for trades
-        trades = []
-        trade_keywords = {
-            'water': 'Water',
-            'sewer': 'Sewer', 
-            'storm': 'Storm',
-            'grading': 'Grading',
-            'electrical': 'Electrical',
-            'concrete': 'Concrete',
-            'plumbing': 'Plumbing'
-        }
-        
-        for keyword, trade_name in trade_keywords.items():
-            if keyword in lower and trade_name not in trades:
-                trades.append(trade_name)
+        trades = [trade_name for trade_name, start, end in get_keyword_matcher().scan(message)['trade']]
         
         return {
             'type': 'create_project',
@@ -1983,46 +5056,44 @@ def parse_command(message, default_assignee='', project_list_id=None):
             'trades': trades
         }
     
-    # Try OpenAI for natural language task creation
-    if OPENAI_API_KEY and len(message) > 15:
-        print(f"🔍 Web: Attempting OpenAI parse for: {message}")
-        ai_result = parse_with_openai(message)
+    # Local parser first, OpenAI for natural language it isn't sure about
+    ai_result = parse_task_tiered(message)
+    
+    if ai_result and ai_result.get('type') == 'create_task':
+        # Build task from AI result
+        task_info = {
+            'type': 'create_task',
+            'name': ai_result.get('name', message),
+            'display_name': ai_result.get('name', message),
+            'priority': ai_result.get('priority', 3),
+            'assignee': ai_result.get('assignee') or default_assignee,
+            'due_date': ai_result.get('due_date'),
+            'description': f"📱 Created via Construction Assistant\n⏰ {datetime.now().strftime('%Y-%m-%d %H:%M')}",
+            'tags': [],
+            'list_id': project_list_id
+        }
         
-        if ai_result and ai_result.get('type') == 'create_task':
-            # Build task from AI result
-            task_info = {
-                'type': 'create_task',
-                'name': ai_result.get('name', message),
-                'display_name': ai_result.get('name', message),
-                'priority': ai_result.get('priority', 3),
-                'assignee': ai_result.get('assignee', default_assignee),
-                'due_date': ai_result.get('due_date'),
-                'description': f"📱 Created via Construction Assistant\n⏰ {datetime.now().strftime('%Y-%m-%d %H:%M')}",
-                'tags': [],
-                'list_id': project_list_id
-            }
-            
-            # Add assignee to display name if present
-            if task_info['assignee']:
-                # Don't duplicate the name if it's already in the task name
-                if task_info['assignee'].lower() not in task_info['name'].lower():
-                    task_info['display_name'] = f"[{task_info['assignee']}] {task_info['name']}"
-                else:
-                    task_info['display_name'] = task_info['name']
-            
-            # Handle priority
-            if task_info['priority'] == 1:
-                task_info['tags'].append('URGENT')
-            
-            # Find project if specified in AI result
-            if ai_result.get('project') and not task_info['list_id']:
-                for key, proj in SETTINGS.get('projects', {}).items():
-                    if key == ai_result['project']:
-                        task_info['list_id'] = proj['list_id']
-                        break
-            
-            print(f"✅ Web OpenAI task created: {task_info['display_name']}, Priority: {task_info['priority']}")
-            return task_info
+        # Add assignee to display name if present
+        if task_info['assignee']:
+            # Don't duplicate the name if it's already in the task name
+            if task_info['assignee'].lower() not in task_info['name'].lower():
+                task_info['display_name'] = f"[{task_info['assignee']}] {task_info['name']}"
+            else:
+                task_info['display_name'] = task_info['name']
+        
+        # Handle priority
+        if task_info['priority'] == 1:
+            task_info['tags'].append('URGENT')
+        
+        # Find project if specified in AI result
+        if ai_result.get('project') and not task_info['list_id']:
+            for key, proj in SETTINGS.get('projects', {}).items():
+                if key == ai_result['project']:
+                    task_info['list_id'] = proj['list_id']
+                    break
+        
+        print(f"✅ Web task parsed: {task_info['display_name']}, Priority: {task_info['priority']}")
+        return task_info
     
     # Fall back to pattern-based parsing for structured commands
     task_info = {
@@ -2037,7 +5108,14 @@ def parse_command(message, default_assignee='', project_list_id=None):
         'list_id': project_list_id
     }
     
-    # Rest of parsing logic...
+    # Due date and priority from the local extractor
+    extracted = extract_due_and_priority(message)
+    task_info['due_date'] = extracted['due_date']
+    if extracted['priority']:
+        task_info['priority'] = extracted['priority']
+        if extracted['priority'] == 1:
+            task_info['tags'].append('URGENT')
+    
     return task_info
 
 def create_project_in_clickup(project_name, trades=None):
@@ -2129,17 +5207,214 @@ def chat():
             'success': False
         })
 
+
+# "- ", "1. ", "2) " - a number needs a space after it so "2.5 yards" keeps its 2
+BATCH_BULLET_RE = re.compile(r'^\s*(?:[-*•]\s*)?(?:\d+[.)](?=\s))?\s*')
+BATCH_CHECKBOX_RE = re.compile(r'^\[\s?(?P<done>[xX])?\s?\]\s*')
+
+def split_punch_list(raw_lines):
+    """Open items of a pasted list with bullets, numbers and checkboxes removed
+
+    Returns (items, done) - checked "[x]" items are already finished, so they
+    are counted rather than turned into new tasks.
+    """
+    items, done = [], 0
+    for raw in raw_lines:
+        line = BATCH_BULLET_RE.sub('', raw, count=1)
+        checkbox = BATCH_CHECKBOX_RE.match(line)
+        if checkbox:
+            line = line[checkbox.end():]
+        line = line.strip()
+        if not line:
+            continue
+        if checkbox and checkbox.group('done'):
+            done += 1
+        else:
+            items.append(line)
+    return items, done
+
+def create_task_from_line(line, default_assignee='', project_list_id=None):
+    """Parse and create one punch-list line; returns its per-line result"""
+    try:
+        result = parse_command(line, default_assignee, project_list_id)
+        if result.get('type') == 'create_project':
+            return {'success': False, 'error': 'Create projects one at a time'}
+        if result.get('type') == 'error':
+            return {'success': False, 'error': result['message']}
+        
+        created = create_clickup_task(result)
+        if not created['success']:
+            return {'success': False, 'error': created.get('error', 'Unknown error')}
+        return {
+            'success': True,
+            'task_id': created['task']['id'],
+            'name': result.get('display_name'),
+            'assignee': result.get('assignee') or None,
+            'due_date': result.get('due_date')
+        }
+    except Exception as e:
+        print(f"Batch line error: {e}")
+        return {'success': False, 'error': str(e)}
+
+@app.route('/api/chat/batch', methods=['POST'])
+def chat_batch():
+    """Create one task per line of a pasted punch list, concurrently
+
+    Lines are parsed and created on up to BATCH_CONCURRENCY threads; the
+    ClickUp rate limiter paces them. Results come back in line order.
+    """
+    data = request.json or {}
+    lines = data.get('lines')
+    if lines is None:
+        lines = str(data.get('message') or '').splitlines()
+    elif not isinstance(lines, list) or not all(isinstance(line, str) for line in lines):
+        return jsonify({
+            'response': '⚠️ lines must be a list of strings',
+            'success': False,
+            'results': []
+        }), 400
+    lines, done = split_punch_list(lines)
+    default_assignee = data.get('default_assignee', '')
+    project_list_id = data.get('project_list_id', '')
+    
+    if not lines:
+        if done:
+            return jsonify({
+                'response': f"✅ All {done} items are already checked off - nothing to create",
+                'success': False,
+                'skipped_done': done,
+                'results': []
+            })
+        return jsonify({'response': 'Please provide a message', 'success': False, 'results': []})
+    if len(lines) > BATCH_MAX_LINES:
+        return jsonify({
+            'response': f"⚠️ Too many lines ({len(lines)}) - the limit is {BATCH_MAX_LINES}",
+            'success': False,
+            'results': []
+        }), 400
+    if not CLICKUP_KEY or not WORKSPACE_ID:
+        return jsonify({
+            'response': '⚠️ Configure ClickUp API in environment variables',
+            'success': False,
+            'results': []
+        })
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(BATCH_CONCURRENCY, len(lines))) as pool:
+        outcomes = list(pool.map(
+            lambda line: create_task_from_line(line, default_assignee, project_list_id), lines
+        ))
+    elapsed = time.perf_counter() - started
+    
+    results = [dict(outcome, line=n, text=line) for n, (line, outcome) in enumerate(zip(lines, outcomes), 1)]
+    created = sum(1 for result in results if result['success'])
+    print(f"📋 Batch: {created}/{len(lines)} tasks in {elapsed:.1f}s")
+    
+    response = f"✅ <strong>{created} of {len(lines)} tasks created</strong><br>"
+    if done:
+        response += f"☑️ Skipped {done} checked-off item{'s' if done != 1 else ''}<br>"
+    for result in results:
+        if not result['success']:
+            response += f"⚠️ Line {result['line']} ({result['text'][:40]}): {result['error']}<br>"
+    
+    return jsonify({
+        'response': response,
+        'success': created > 0,
+        'created': created,
+        'failed': len(lines) - created,
+        'skipped_done': done,
+        'elapsed_ms': round(elapsed * 1000),
+        'results': results
+    })
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
+        'ready': is_ready(),
+        'startup': {
+            'import_ms': IMPORT_MS,
+            'sync': SYNC_STATE
+        },
         'clickup_configured': bool(CLICKUP_KEY and WORKSPACE_ID),
         'twilio_configured': bool(TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN),
         'openai_configured': bool(OPENAI_API_KEY),
-        'settings_file': os.path.exists(SETTINGS_FILE)
+        'settings_file': os.path.exists(SETTINGS_FILE),
+        'settings_backend': settings_store.name,
+        'settings_version': SETTINGS_VERSION
     })
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Cache and index counters for this worker process"""
+    return jsonify({
+        'pid': os.getpid(),
+        'images': image_stats(),
+        'media_cache': media_store.stats(),
+        'transcription': transcription_stats(),
+        'idempotency': webhook_idempotency.stats(),
+        'sms_latency': sms_latency_stats(),
+        'parser': parser_stats(),
+        'parse_cache': parse_cache.stats(),
+        'clickup_reads': clickup_read_cache.stats(),
+        'clickup_rate': clickup.limiter.stats(),
+        'settings_reads': dict(SETTINGS_READ_METRICS),
+        'task_index': task_index.stats()
+    })
+
+def admin_authorized():
+    """Admin endpoints require X-Admin-Token; they are disabled when ADMIN_TOKEN is unset"""
+    if not ADMIN_TOKEN:
+        return False
+    return hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN)
+
+@app.route('/api/admin/topology', methods=['GET'])
+def topology_status():
+    """Show the cached workspace topology summary"""
+    if not admin_authorized():
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    return jsonify(workspace_topology.stats())
+
+@app.route('/api/admin/topology/refresh', methods=['POST'])
+def refresh_topology():
+    """Force a topology refresh and re-sync projects from it"""
+    if not admin_authorized():
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    try:
+        changed = workspace_topology.refresh()
+        if changed:
+            sync_clickup_lists_on_startup()
+        return jsonify({'success': True, 'changed': changed, **workspace_topology.stats()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 502
+
+@app.route('/api/admin/stt/benchmark', methods=['POST'])
+def benchmark_transcribers():
+    """Run an uploaded clip (form field 'audio') through every available backend"""
+    if not admin_authorized():
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    upload = request.files.get('audio')
+    if not upload:
+        return jsonify({'success': False, 'error': 'audio file required'}), 400
+    
+    audio_data = upload.read()
+    filename = upload.filename or 'voice.mp3'
+    results = {}
+    for name, backend in TRANSCRIBERS.items():
+        if not backend.available():
+            results[name] = {'available': False}
+            continue
+        try:
+            # Model loading is not part of the measurement
+            backend.warm(wait=True)
+            text, ms, rtf = run_transcriber(backend, audio_data, filename)
+            results[name] = {'available': True, 'ms': round(ms), 'rtf': round(rtf, 3) if rtf else None,
+                             'text': text}
+        except Exception as e:
+            results[name] = {'available': True, 'error': str(e)}
+    return jsonify({'success': True, 'bytes': len(audio_data), 'backends': results})
+
 @app.route('/test-attachment', methods=['GET'])
 def test_attachment():
     """Test endpoint for debugging attachments"""
@@ -2176,7 +5451,10 @@ def test_attachment():
             'message': str(e)
         })
 
+IMPORT_MS = round((time.perf_counter() - _IMPORT_STARTED) * 1000, 1)
+
 if __name__ == '__main__':
+    ensure_started()
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
 
@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# Keep the app's sqlite files out of the working tree
+_tmp = tempfile.mkdtemp(prefix='clickup-tests-')
+for var, name in [('SETTINGS_DB', 'settings.db'), ('CLICKUP_RATE_DB', 'clickup_rate.db'),
+                  ('MEDIA_CACHE_DB', 'media_cache.db'), ('MEDIA_CACHE_DIR', 'media_cache'),
+                  ('SMS_QUEUE_DB', 'sms_queue.db'), ('IDEMPOTENCY_DB', 'webhooks.db')]:
+    os.environ.setdefault(var, os.path.join(_tmp, name))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,58 @@
+from datetime import date
+
+import pytest
+
+import app
+
+TODAY = date(2026, 10, 17)
+
+
+def extract(text):
+    return app.extract_due_and_priority(text, today=TODAY)
+
+
+@pytest.mark.parametrize('text', [
+    'replace 3/4 valve',
+    'oak: replace 3/4 valve',
+    '1/2 inch pipe',
+    '1/2" copper to the sink',
+    '3/4 in ball valve',
+    '10/12 pitch roof',
+    '5/8 ply for the subfloor',
+    'cut 2x4 at 1/2',
+    'need 3/4 of the drywall hung',
+])
+def test_fractions_are_not_dates(text):
+    result = extract(text)
+    assert result['due_date'] is None
+    assert app.strip_spans(text, result['spans']) == text
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('due 3/4', '2027-03-04'),
+    ('inspection by 11/2', '2026-11-02'),
+    ('pour footings on 10/20', '2026-10-20'),
+    ('framing walk 3/4/2027', '2027-03-04'),
+    ('framing walk 3/4/27', '2027-03-04'),
+])
+def test_month_day_dates(text, expected):
+    assert extract(text)['due_date'] == expected
+
+
+def test_due_date_ignores_fraction_before_real_date():
+    text = 'replace 3/4 valve by 11/2'
+    result = extract(text)
+    assert result['due_date'] == '2026-11-02'
+    assert app.strip_spans(text, result['spans']).strip() == 'replace 3/4 valve'
+
+
+def test_due_fraction_with_unit_is_not_a_date():
+    assert extract('due 3/4 inch valve')['due_date'] is None
+
+
+def test_local_parse_keeps_fraction_in_name(monkeypatch):
+    monkeypatch.setattr(app, 'SETTINGS', {'projects': {'oak': {'name': 'Oak Street'}}, 'team_members': {}})
+    parsed = app.parse_locally('oak: replace 3/4 valve')
+    assert parsed['name'] == 'Replace 3/4 valve'
+    assert parsed['due_date'] is None
+    assert parsed['project'] == 'oak'
@@ -0,0 +1,35 @@
+import app
+
+
+def test_bullets_and_numbers_are_removed():
+    items, done = app.split_punch_list([
+        '- hang drywall in garage',
+        '* patch hole by stairs',
+        '• caulk tub',
+        '1. reset toilet',
+        '2) paint trim',
+        '',
+        '   ',
+    ])
+    assert items == ['hang drywall in garage', 'patch hole by stairs', 'caulk tub',
+                     'reset toilet', 'paint trim']
+    assert done == 0
+
+
+def test_decimals_keep_their_integer_part():
+    items, _ = app.split_punch_list(['2.5 yards of gravel', '1.5 inch conduit', '3) 2.5 yards of mulch'])
+    assert items == ['2.5 yards of gravel', '1.5 inch conduit', '2.5 yards of mulch']
+
+
+def test_checked_items_are_skipped():
+    items, done = app.split_punch_list(['[x] order trusses', '- [X] pull permit', '[ ] frame walls', '- [] hang doors'])
+    assert items == ['frame walls', 'hang doors']
+    assert done == 2
+
+
+def test_lines_must_be_strings():
+    client = app.app.test_client()
+    for lines in ['not a list', ['ok', 3], [{'text': 'x'}]]:
+        response = client.post('/api/chat/batch', json={'lines': lines})
+        assert response.status_code == 400
+        assert response.get_json()['success'] is False
@@ -0,0 +1,48 @@
+import os
+import time
+
+import app
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.sent = 0
+
+    def request(self, method, url, **kwargs):
+        self.sent += 1
+        return self.responses.pop(0)
+
+
+def client(tmp_path, responses, per_minute=100):
+    limiter = app.ClickUpRateLimiter(str(tmp_path / 'rate.db'), per_minute)
+    clickup = app.ClickUpClient('key', 'https://api.example', limiter=limiter)
+    clickup._session, clickup._pid = FakeSession(responses), os.getpid()
+    return clickup
+
+
+def test_429_blocked_past_the_budget_is_returned(tmp_path):
+    reset = str(time.time() + 120)
+    clickup = client(tmp_path, [FakeResponse(429, {'X-RateLimit-Reset': reset}), FakeResponse(200)])
+    started = time.time()
+    response = clickup.request('POST', '/task', priority='write')
+    assert response.status_code == 429
+    assert clickup.session.sent == 1
+    assert time.time() - started < 1
+    assert clickup.limiter.stats()['returned_429'] == 1
+
+
+def test_429_resetting_within_the_budget_is_resent(tmp_path):
+    reset = str(time.time() + 0.2)
+    # Fast bucket and no reserve, so the refill after the 429 takes milliseconds
+    clickup = client(tmp_path, [FakeResponse(429, {'X-RateLimit-Reset': reset}), FakeResponse(200)], 60000)
+    response = clickup.request('POST', '/task', priority='safety')
+    assert response.status_code == 200
+    assert clickup.session.sent == 2
+    assert clickup.limiter.stats()['retried_429'] == 1
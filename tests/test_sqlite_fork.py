@@ -0,0 +1,21 @@
+import os
+import threading
+
+import pytest
+
+import app
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_connections_are_reopened_after_fork():
+    local = threading.local()
+    local.conn, local.pid = object(), os.getpid()
+    assert app.thread_connection(local) is local.conn
+
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.write(write, b'1' if app.thread_connection(local) is None else b'0')
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert os.read(read, 1) == b'1'
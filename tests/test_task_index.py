@@ -0,0 +1,112 @@
+import hashlib
+import hmac
+import json
+import threading
+import time
+
+import pytest
+
+import app
+
+
+def task(task_id, name, updated):
+    return {'id': task_id, 'name': name, 'status': {'type': 'open'}, 'list': {'id': 'L1'},
+            'date_updated': str(updated)}
+
+
+@pytest.fixture
+def index():
+    index = app.TaskIndex()
+    index.upsert(task('86a1b2c3d', 'Order 2x4 lumber', 100))
+    index.upsert(task('86a9f8e7d', 'Call inspector about permit', 200))
+    index.upsert(task('86a5k4j3h', 'Hang drywall in garage', 300))
+    index.upsert(task('86a6m5n4p', 'Patch drywall by stairs', 400))
+    return index
+
+
+@pytest.mark.parametrize('identifier', ['2', 'a', 'in', 'by', '2 a'])
+def test_short_tokens_match_nothing(index, identifier):
+    assert index.find(identifier) == []
+
+
+def test_digits_are_ids_only(index):
+    assert index.find('2') == []
+    assert index.find('12345') == []
+
+
+def test_exact_and_short_ids(index):
+    assert index.find('86a1b2c3d') == ['86a1b2c3d']
+    assert index.find('2c3d') == []
+    assert index.find('b2c3d') == ['86a1b2c3d']
+    assert index.find('#b2c3d') == ['86a1b2c3d']
+
+
+def test_unique_name_match(index):
+    assert index.find('inspector') == ['86a9f8e7d']
+    assert index.find('order lumber') == ['86a1b2c3d']
+
+
+def test_ambiguous_name_returns_every_candidate(index):
+    assert index.find('drywall') == ['86a6m5n4p', '86a5k4j3h']
+
+
+def test_full_name_picks_that_task(index):
+    assert index.find('hang drywall in garage') == ['86a5k4j3h']
+
+
+def test_closed_tasks_are_dropped(index):
+    index.upsert(dict(task('86a9f8e7d', 'Call inspector about permit', 500), status={'type': 'closed'}))
+    assert index.find('inspector') == []
+
+
+def test_mark_complete_does_not_guess(index, monkeypatch):
+    monkeypatch.setattr(app, 'task_index', index)
+    monkeypatch.setattr(index, 'ensure_fresh', lambda wait=None: None)
+    puts = []
+    monkeypatch.setattr(app.clickup, 'put', lambda *args, **kwargs: puts.append(args))
+
+    result = app.mark_task_complete('drywall')
+    assert not result['success']
+    assert [tid for tid, _ in result['candidates']] == ['86a6m5n4p', '86a5k4j3h']
+
+    result = app.mark_task_complete('a')
+    assert not result['success']
+    assert puts == []
+
+
+def test_webhook_refused_without_secret(monkeypatch):
+    monkeypatch.setattr(app, 'CLICKUP_WEBHOOK_SECRET', '')
+    response = app.app.test_client().post('/clickup/webhook', json={'task_id': 'x', 'event': 'taskUpdated'})
+    assert response.status_code == 401
+
+
+def test_webhook_refetches_off_the_request(index, monkeypatch):
+    monkeypatch.setattr(app, 'CLICKUP_WEBHOOK_SECRET', 'sekrit')
+    monkeypatch.setattr(app, 'task_index', index)
+    release, fetched = threading.Event(), threading.Event()
+
+    class Response:
+        status_code = 200
+
+        def json(self):
+            return task('86a7q6r5s', 'Set trusses', 500)
+
+    def get(path, **kwargs):
+        release.wait(5)
+        fetched.set()
+        return Response()
+
+    monkeypatch.setattr(app.clickup, 'get', get)
+    body = json.dumps({'task_id': '86a7q6r5s', 'event': 'taskCreated'}).encode()
+    signature = hmac.new(b'sekrit', body, hashlib.sha256).hexdigest()
+    response = app.app.test_client().post('/clickup/webhook', data=body, content_type='application/json',
+                                          headers={'X-Signature': signature})
+    assert response.status_code == 200
+    assert not fetched.is_set()
+    release.set()
+    assert fetched.wait(5)
+    for _ in range(50):
+        if index.find('trusses'):
+            break
+        time.sleep(0.01)
+    assert index.find('trusses') == ['86a7q6r5s']